@@ -1,16 +1,22 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy import event, select
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
-from database import get_db, User
+from database import get_db, AsyncSessionLocal, User, UserTokenVersion
+from queries import dialect_insert
 from models import SessionData, UserRole
+from cache import TTLCache
 
 load_dotenv()
 
@@ -19,8 +25,40 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
+# Password hashing pool. bcrypt releases the GIL, so a thread pool keeps the
+# event loop free while hashes are computed. HASH_WORKERS=0 hashes inline.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 32))
+
+# Authenticated users are cached per (user id, token iat) so that steady-state
+# authentication is a JWT decode plus a dict lookup. Writes to a user must call
+# invalidate_cached_user, which only reaches this worker: other workers keep
+# their entry until AUTH_CACHE_TTL_SECONDS pass, except that a revoked token
+# (see below) is rejected before the cache is consulted. AUTH_CACHE_SIZE=0
+# disables the cache.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+
+# A token stops working once its ver claim is below the user's row in
+# user_token_versions, which revoke_user_tokens bumps when a user's role,
+# username or password changes. Each worker re-reads that table at most every
+# TOKEN_VERSION_REFRESH_SECONDS, so a revoked token can keep working in other
+# workers for up to that long. Stateless mode (AUTH_STATELESS=true) then
+# authenticates from the token's role and username claims without reading the
+# users table. Tokens without the claims (issued before they existed) take the
+# database path.
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() == "true"
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", 5))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+_hash_executor = (
+    ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+    if HASH_WORKERS > 0 else None
+)
+_hash_inflight = 0
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -28,20 +66,87 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_hash_job(func, *args):
+    """Run a bcrypt call on the hashing pool, rejecting work once the queue is full"""
+    global _hash_inflight
+    if _hash_executor is None:
+        return func(*args)
+    if _hash_inflight >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _hash_inflight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_inflight -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_claims(user: User, token_version: int) -> dict:
+    """Token claims for user"""
+    return {"sub": str(user.id), "role": user.role, "username": user.username, "ver": token_version}
+
+class TokenUser(NamedTuple):
+    """The authenticated user as described by a stateless token's claims"""
+    id: int
+    role: str
+    username: str
+
+_token_versions: dict[int, int] = {}
+_token_versions_loaded_at = float("-inf")
+
+async def token_versions() -> dict[int, int]:
+    """This worker's copy of user_token_versions, re-read when it is too old"""
+    global _token_versions, _token_versions_loaded_at
+    now = time.monotonic()
+    if now - _token_versions_loaded_at >= TOKEN_VERSION_REFRESH_SECONDS:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(UserTokenVersion.user_id, UserTokenVersion.version))
+            _token_versions = dict(result.all())
+        _token_versions_loaded_at = now
+    return _token_versions
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int) -> None:
+    """Invalidate user_id's existing tokens as part of db's transaction"""
+    stmt = dialect_insert(UserTokenVersion).values(user_id=user_id, version=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserTokenVersion.user_id],
+        set_={"version": UserTokenVersion.version + 1},
+    ))
+    db.info["revoked_tokens"] = True
+
+@event.listens_for(Session, "after_commit")
+def _reload_token_versions_after_revoke(session):
+    global _token_versions_loaded_at
+    if session.info.pop("revoked_tokens", False):
+        _token_versions_loaded_at = float("-inf")
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_revoke(session):
+    session.info.pop("revoked_tokens", None)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
-) -> User:
+) -> Union[User, TokenUser]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -51,20 +156,37 @@ async def get_current_user(
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
     
+    if isinstance(payload.get("ver"), int) and payload["ver"] < (await token_versions()).get(user_id, 0):
+        raise credentials_exception
+    
+    if AUTH_STATELESS and isinstance(payload.get("ver"), int) and payload.get("role") in UserRole._value2member_map_:
+        return TokenUser(id=user_id, role=payload["role"], username=payload.get("username", ""))
+    
+    cache_key = (user_id, payload.get("iat"))
+    user = user_cache.get(cache_key)
+    if user is not None:
+        return user
+    
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     
     if user is None:
         raise credentials_exception
     
+    # Detach the row so the cached instance is never refreshed or expired by
+    # a later commit in this request's session
+    db.expunge(user)
+    user_cache.set(cache_key, user)
     return user
 
+def invalidate_cached_user(user_id: int) -> None:
+    """Drop cached rows for a user after their profile, role or password changes"""
+    user_cache.invalidate(lambda key: key[0] == user_id)
+
 async def get_current_user_session(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
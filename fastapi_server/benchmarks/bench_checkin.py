@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Compare the old five round-trip QR check-in with the fused check_in path.
+
+Uses DATABASE_URL when set (e.g. a PostgreSQL database), otherwise a
+throwaway SQLite file. Each scan checks a distinct student into a class and
+commits, exactly as the /api/attendance/qr-scan handler does.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+from sqlalchemy import event, insert, select
+
+from checkin import check_in
+from database import AsyncSessionLocal, Attendance, Class, Student, engine, init_db, writer_engine
+
+statements = 0
+
+
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+for target in {engine, writer_engine}:
+    event.listen(target.sync_engine, "before_cursor_execute", count_statement)
+
+
+async def legacy_scan(db, qr_code, class_id):
+    """The pre-fusion handler: three SELECTs, INSERT, COMMIT, refresh"""
+    today = datetime.now().date()
+    student = (await db.execute(select(Student).where(Student.qr_code == qr_code))).scalar_one()
+    (await db.execute(select(Class).where(Class.id == class_id))).scalar_one()
+    (await db.execute(select(Attendance).where(
+        Attendance.student_id == student.id,
+        Attendance.class_id == class_id,
+        Attendance.check_in_time >= today
+    ))).scalar_one_or_none()
+    attendance = Attendance(
+        student_id=student.id, class_id=class_id, dojo_id=student.dojo_id,
+        check_in_time=datetime.now(), check_in_method="qr_code", checked_in_by=1
+    )
+    db.add(attendance)
+    await db.commit()
+    await db.refresh(attendance)
+    return attendance
+
+
+async def fused_scan(db, qr_code, class_id):
+    attendance = await check_in(db, Student.qr_code == qr_code, class_id, method="qr_code", checked_in_by=1)
+    await db.commit()
+    return attendance
+
+
+async def measure(label, scan, qr_codes, class_id):
+    global statements
+    statements = 0
+    latencies = []
+    for qr_code in qr_codes:
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            await scan(db, qr_code, class_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"{label:<8} p50={statistics.median(latencies):.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms "
+          f"statements/scan={statements / len(qr_codes):.1f}")
+
+
+async def run(scans: int):
+    await init_db(seed=True)
+    prefix = f"DOJO:1:STUDENT:{int(time.time())}"
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Student), [
+            {"dojo_id": 1, "belt_level": "white", "qr_code": f"{prefix}{i:05d}"}
+            for i in range(scans)
+        ])
+        classes = [
+            Class(name=f"Bench {n}", instructor_id=1, dojo_id=1, day_of_week="monday",
+                  start_time="18:00", end_time="19:00")
+            for n in range(2)
+        ]
+        db.add_all(classes)
+        await db.commit()
+    qr_codes = [f"{prefix}{i:05d}" for i in range(scans)]
+    print(f"backend={engine.dialect.name} scans={scans}")
+    await measure("legacy", legacy_scan, qr_codes, classes[0].id)
+    await measure("fused", fused_scan, qr_codes, classes[1].id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scans", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.scans))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Measure cold start: launching serve.py until the first request succeeds.
+
+Each run starts a real server against a SQLite file and polls /api/health.
+The first boot creates the schema (and seeds it with --seed). Later boots of
+the same database find SCHEMA_VERSION recorded and skip migration:
+
+    python benchmarks/bench_cold_start.py --workers 1 4
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_workers import free_port
+
+
+def time_to_first_request(database_url: str, workers: int, seed: bool) -> float:
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL="warning",
+               SEED_DATA="true" if seed else "false")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.02)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--boots", type=int, default=3, help="boots of the migrated database to time")
+    parser.add_argument("--seed", action="store_true", help="seed the demo data on first boot")
+    args = parser.parse_args()
+    for workers in args.workers:
+        database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+        first = time_to_first_request(database_url, workers, args.seed)
+        later = [time_to_first_request(database_url, workers, args.seed) for _ in range(args.boots)]
+        print(f"workers={workers}  first boot {first:.2f}s  "
+              f"migrated boots min={min(later):.2f}s max={max(later):.2f}s")
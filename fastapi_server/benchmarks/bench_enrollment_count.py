@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Compare loading rows to count them with COUNT/EXISTS queries.
+
+Seeds one class with --rows enrollment history rows in a throwaway SQLite
+database, then times the old len(scalars().all()) pattern against the
+queries.count_where / queries.exists_where helpers.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+from sqlalchemy import insert, select
+
+from database import AsyncSessionLocal, Enrollment, init_db
+from queries import count_where, exists_where
+
+STATUSES = ["enrolled", "dropped", "completed", "waitlisted"]
+
+
+async def timed(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        value = await func()
+    elapsed = (time.perf_counter() - start) / iterations * 1000
+    print(f"{label:<28} {elapsed:8.2f} ms/call  -> {value}")
+
+
+async def run(rows: int, iterations: int):
+    await init_db(seed=True)
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Enrollment), [
+            {
+                "student_id": i + 1,
+                "class_id": 1,
+                "status": STATUSES[i % len(STATUSES)],
+                "enrolled_by": 1,
+            }
+            for i in range(rows)
+        ])
+        await db.commit()
+
+        criteria = (Enrollment.class_id == 1, Enrollment.status == "enrolled")
+
+        async def load_and_len():
+            result = await db.execute(select(Enrollment).where(*criteria))
+            return len(result.scalars().all())
+
+        await timed("len(scalars().all())", load_and_len, iterations)
+        await timed("count_where", lambda: count_where(db, Enrollment, *criteria), iterations)
+        await timed("exists_where", lambda: exists_where(db, Enrollment, *criteria), iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.iterations))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Measure /api/health latency while concurrent logins are hashing passwords.
+
+Runs the app in-process against a throwaway SQLite database. Compare inline
+hashing with the hashing pool:
+
+    HASH_WORKERS=0 python benchmarks/bench_login_latency.py
+    HASH_WORKERS=4 python benchmarks/bench_login_latency.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+import httpx
+
+from database import init_db
+from main import app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(logins: int, interval: float):
+    await init_db(seed=True)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def login():
+            response = await client.post("/api/auth/login", json={
+                "username": "instructor",
+                "password": "password12377"
+            })
+            return response.status_code
+
+        async def health(done: asyncio.Event):
+            # Latency is measured from when the probe was due, so time spent
+            # waiting for a blocked event loop is included.
+            latencies = []
+            due = time.perf_counter()
+            while not done.is_set():
+                await client.get("/api/health")
+                finished = time.perf_counter()
+                latencies.append((finished - due) * 1000)
+                due = finished + interval
+                await asyncio.sleep(interval)
+            return latencies
+
+        done = asyncio.Event()
+        probe = asyncio.create_task(health(done))
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        latencies = await probe
+
+    print(f"HASH_WORKERS={os.getenv('HASH_WORKERS', 'default')} logins={logins} "
+          f"elapsed={elapsed:.2f}s rejected={statuses.count(503)}")
+    print(f"/api/health p50={statistics.median(latencies):.1f}ms "
+          f"p99={percentile(latencies, 99):.1f}ms max={max(latencies):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--interval", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.interval))
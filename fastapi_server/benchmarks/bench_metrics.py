@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Measure the per-request cost of the /metrics instrumentation.
+
+Runs the same in-process request loop with METRICS_ENABLED=false and true,
+each in a fresh interpreter against its own throwaway SQLite database, and
+reports CPU time per request for a database-free route (/api/health) and a
+route that runs queries (GET /api/classes/{id}).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+
+async def measure(requests: int, rounds: int):
+    import httpx
+    from database import init_db
+    from main import app
+
+    await init_db(seed=True)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/api/auth/login", json={
+            "username": "instructor", "password": "password12377"
+        })).json()["accessToken"]
+        headers = {"Authorization": f"Bearer {token}"}
+        class_id = (await client.post("/api/classes", json={
+            "name": "Bench Class", "instructorId": 1, "dojoId": 1, "dayOfWeek": "monday",
+            "startTime": "18:00", "endTime": "19:00"
+        }, headers=headers)).json()["id"]
+
+        for path in ("/api/health", f"/api/classes/{class_id}"):
+            per_request = []
+            for _ in range(rounds):
+                started = time.process_time()
+                for _ in range(requests):
+                    (await client.get(path, headers=headers)).raise_for_status()
+                per_request.append((time.process_time() - started) / requests * 1e6)
+            label = path if path == "/api/health" else "/api/classes/{id}"
+            print(f"  {label:<18} cpu/request p50={statistics.median(per_request):7.1f}us "
+                  f"min={min(per_request):7.1f}us")
+
+
+def run_child(enabled: bool, requests: int, rounds: int):
+    env = dict(os.environ)
+    env["METRICS_ENABLED"] = "true" if enabled else "false"
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+    print(f"METRICS_ENABLED={env['METRICS_ENABLED']}", flush=True)
+    subprocess.run(
+        [sys.executable, __file__, "--child", "--requests", str(requests), "--rounds", str(rounds)],
+        env=env, check=True
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500, help="requests per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(measure(args.requests, args.rounds))
+    else:
+        for enabled in (False, True):
+            run_child(enabled, args.requests, args.rounds)
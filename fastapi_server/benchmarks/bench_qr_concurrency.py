@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Measure POST /api/attendance/qr-scan write throughput under parallel clients.
+
+Runs the app in-process against a throwaway SQLite file. Each client checks
+its own students into a class, so every request is a real write. Compare the
+old rollback-journal setup with the WAL single-writer profile:
+
+    DB_SQLITE_JOURNAL_MODE=delete DB_SQLITE_SYNCHRONOUS=full DB_SQLITE_SINGLE_WRITER=false \\
+        python benchmarks/bench_qr_concurrency.py
+    python benchmarks/bench_qr_concurrency.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+import httpx
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal, Class, Student, engine_settings, init_db
+from main import app
+
+
+async def seed(clients: int, scans: int):
+    async with AsyncSessionLocal() as db:
+        cls = Class(
+            name="Bench Class", instructor_id=1, dojo_id=1, day_of_week="monday",
+            start_time="18:00", end_time="19:00", max_capacity=20
+        )
+        db.add(cls)
+        await db.flush()
+        base = int(time.time()) * 100000
+        qr_codes = [[f"DOJO:1:STUDENT:{base + c * scans + i}" for i in range(scans)] for c in range(clients)]
+        await db.execute(insert(Student), [
+            {"dojo_id": 1, "belt_level": "white", "qr_code": qr_code, "is_active": True}
+            for codes in qr_codes for qr_code in codes
+        ])
+        await db.commit()
+        return cls.id, qr_codes
+
+
+async def run(clients: int, scans: int):
+    await init_db(seed=True)
+    class_id, qr_codes = await seed(clients, scans)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/api/auth/login", json={
+            "username": "instructor", "password": "password12377"
+        })).json()["accessToken"]
+        headers = {"Authorization": f"Bearer {token}"}
+        statuses = Counter()
+        latencies = []
+
+        async def scan_all(codes):
+            for qr_code in codes:
+                started = time.perf_counter()
+                response = await client.post("/api/attendance/qr-scan", json={
+                    "qrCode": qr_code, "classId": class_id
+                }, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(scan_all(codes) for codes in qr_codes))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"journal_mode={engine_settings.sqlite_journal_mode} "
+          f"single_writer={engine_settings.sqlite_single_writer} clients={clients}")
+    print(f"  {statuses[200] / elapsed:8.0f} check-ins/s  "
+          f"p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p99={latencies[int(0.99 * (len(latencies) - 1))] * 1000:.1f}ms  "
+          f"statuses={dict(statuses)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--scans", type=int, default=20, help="scans per client")
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.scans))
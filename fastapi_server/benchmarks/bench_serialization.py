@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure CPU time per 10k-row GET /api/attendance response.
+
+Compares the old handler shape (hand-built AttendanceModel objects that
+FastAPI validates again against response_model) with the current one
+(validate once from attributes, encode with pydantic-core). Runs the app
+in-process against a throwaway SQLite database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+os.environ.setdefault("MAX_PAGE_SIZE", "100000")
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import insert, select
+
+from database import AsyncSessionLocal, Attendance, get_db, init_db
+from main import app
+from models import Attendance as AttendanceModel
+from routes import attendance_to_model
+
+
+@app.get("/bench/legacy-attendance", response_model=List[AttendanceModel])
+async def legacy_attendance(limit: int, db=Depends(get_db)):
+    """The pre-change handler body: build each model by hand, let FastAPI revalidate"""
+    result = await db.execute(select(Attendance).order_by(Attendance.id.desc()).limit(limit + 1))
+    return [attendance_to_model(record) for record in result.scalars().all()[:limit]]
+
+
+async def seed(rows: int):
+    async with AsyncSessionLocal() as db:
+        now = datetime.now()
+        await db.execute(insert(Attendance), [
+            {"student_id": 1, "class_id": 1, "dojo_id": 1, "check_in_time": now,
+             "check_in_method": "qr_code", "checked_in_by": 1, "notes": "bench"}
+            for _ in range(rows)
+        ])
+        await db.commit()
+
+
+async def measure(client, label, path, rows, repeat):
+    cpu = []
+    for _ in range(repeat):
+        started = time.process_time()
+        response = await client.get(path, params={"limit": rows})
+        response.raise_for_status()
+        cpu.append((time.process_time() - started) * 1000)
+    assert len(response.json()) == rows
+    print(f"{label:<8} cpu/response p50={statistics.median(cpu):.1f}ms min={min(cpu):.1f}ms "
+          f"bytes={len(response.content)}")
+
+
+async def run(rows: int, repeat: int):
+    await init_db(seed=True)
+    await seed(rows)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        token = (await client.post("/api/auth/login", json={
+            "username": "instructor", "password": "password12377"
+        })).json()["accessToken"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        await measure(client, "legacy", "/bench/legacy-attendance", rows, repeat)
+        await measure(client, "current", "/api/attendance", rows, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure importing students through POST /api/students/bulk.
+
+Imports --rows students as a streamed CSV upload and as a JSON array, and
+times a run of single POST /api/students calls for comparison. Runs the app
+in-process against a throwaway SQLite database.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+os.environ.setdefault("MAX_IMPORT_ROWS", "100000")
+
+import httpx
+
+from database import init_db
+from main import app
+
+
+def csv_chunks(rows: int, chunk_rows: int = 500):
+    """Yield the CSV body in pieces, like a client streaming an upload"""
+    yield b"dojoId,beltLevel,age\n"
+    for start in range(0, rows, chunk_rows):
+        yield "".join(
+            f"1,white,{6 + i % 12}\n" for i in range(start, min(start + chunk_rows, rows))
+        ).encode()
+
+
+async def run(rows: int, singles: int):
+    await init_db(seed=True)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        token = (await client.post("/api/auth/login", json={
+            "username": "instructor", "password": "password12377"
+        })).json()["accessToken"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def stream():
+            for chunk in csv_chunks(rows):
+                yield chunk
+
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/students/bulk", content=stream(), headers={**headers, "Content-Type": "text/csv"}
+        )
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        print(f"csv    {len(response.json()):6d} students in {elapsed:6.2f}s  "
+              f"{len(response.json()) / elapsed:8.0f} students/s")
+
+        body = [{"dojoId": 1, "beltLevel": "white", "age": 6 + i % 12} for i in range(rows)]
+        started = time.perf_counter()
+        response = await client.post("/api/students/bulk", json=body, headers=headers)
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        print(f"json   {len(response.json()):6d} students in {elapsed:6.2f}s  "
+              f"{len(response.json()) / elapsed:8.0f} students/s")
+
+        started = time.perf_counter()
+        for i in range(singles):
+            response = await client.post("/api/students", json={"dojoId": 1, "age": 10}, headers=headers)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        print(f"single {singles:6d} students in {elapsed:6.2f}s  {singles / elapsed:8.0f} students/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--singles", type=int, default=500, help="single POST /api/students calls to time")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.singles))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Measure GET /api/classes throughput with one worker vs several.
+
+Starts serve.py as a real server for each worker count against a throwaway
+SQLite database, drives it from several client processes, then stops it with
+SIGTERM (exercising the graceful drain):
+
+    python benchmarks/bench_workers.py --workers 1 4
+
+Clients share the machine with the server, so on small hosts the numbers
+understate what separate load generators would see.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def drive(base_url: str, token: str, concurrency: int, duration: float):
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def loop():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get("/api/classes")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies
+
+
+def client_process(base_url, token, concurrency, duration, results):
+    results.put(asyncio.run(drive(base_url, token, concurrency, duration)))
+
+
+def run(workers: int, clients: int, concurrency: int, duration: float) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+    env["LOG_LEVEL"] = "warning"
+    env["SEED_DATA"] = "true"
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(base_url)
+        token = httpx.post(f"{base_url}/api/auth/login", json={
+            "username": "instructor", "password": "password12377"
+        }).json()["accessToken"]
+
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=client_process, args=(base_url, token, concurrency, duration, results))
+            for _ in range(clients)
+        ]
+        for proc in procs:
+            proc.start()
+        latencies = [sample for _ in procs for sample in results.get()]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=min(4, os.cpu_count() or 1),
+                        help="client processes generating load")
+    parser.add_argument("--concurrency", type=int, default=32, help="in-flight requests per client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        result = run(workers, args.clients, args.concurrency, args.duration)
+        print(f"workers={result['workers']:<3} {result['rps']:8.0f} req/s  "
+              f"p50={result['p50']:.1f}ms p99={result['p99']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from typing import Optional
+
+from database import Class, Enrollment
+from versions import bump_after_commit
+
+# Class.current_enrollment is only ever changed through these helpers. Each is
+# a single conditional UPDATE, so the capacity check and the write happen
+# atomically in the database and concurrent requests cannot overbook a class
+# or drive the counter below zero. Callers commit as part of their own
+# transaction, then call publish_version_bumps. A successful change bumps the
+# class_seats version, since the counter is part of every class response and
+# the roster decides which classes a student is shown.
+#
+# Seats given back by a drop or a cancelled booking go to the class's waitlist
+# first (hand_over_seat). The longest-waiting enrollment is flipped from
+# waitlisted to enrolled in the same transaction, so the seat changes hands
+# without the counter ever moving.
+
+async def reserve_seat(db: AsyncSession, class_id: int) -> bool:
+    """Take one seat in a class, returning False if the class is full or missing"""
+    result = await db.execute(
+        update(Class)
+        .where(Class.id == class_id, Class.current_enrollment < Class.max_capacity)
+        .values(current_enrollment=Class.current_enrollment + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    bump_after_commit(db, "class_seats")
+    return True
+
+async def release_seat(db: AsyncSession, class_id: int) -> bool:
+    """Give back one seat in a class, returning False if none were taken"""
+    result = await db.execute(
+        update(Class)
+        .where(Class.id == class_id, Class.current_enrollment > 0)
+        .values(current_enrollment=Class.current_enrollment - 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    bump_after_commit(db, "class_seats")
+    return True
+
+async def promote_waitlisted(db: AsyncSession, class_id: int, exclude_id: Optional[int] = None) -> Optional[int]:
+    """Enroll the longest-waiting waitlisted student into a seat being given back.
+
+    Returns the promoted enrollment id, or None when nobody is waiting or the
+    class is over capacity (its max_capacity was lowered). exclude_id keeps an
+    enrollment that was just moved to the waitlist from taking its own seat.
+    """
+    next_in_line = (
+        select(Enrollment.id)
+        .where(Enrollment.class_id == class_id, Enrollment.status == "waitlisted")
+        .order_by(Enrollment.enrollment_date, Enrollment.id)
+        .limit(1)
+        # Concurrent drops on PostgreSQL each promote a different student
+        .with_for_update(skip_locked=True)
+    )
+    if exclude_id is not None:
+        next_in_line = next_in_line.where(Enrollment.id != exclude_id)
+    within_capacity = (
+        select(Class.id)
+        .where(Class.id == class_id, Class.current_enrollment <= Class.max_capacity)
+        .exists()
+    )
+    result = await db.execute(
+        update(Enrollment)
+        .where(
+            Enrollment.id == next_in_line.scalar_subquery(),
+            Enrollment.status == "waitlisted",
+            within_capacity,
+        )
+        .values(status="enrolled")
+        .returning(Enrollment.id)
+        .execution_options(synchronize_session=False)
+    )
+    promoted = result.scalar_one_or_none()
+    if promoted is not None:
+        # The counter stays put, but the promoted student's class list changes
+        bump_after_commit(db, "class_seats")
+    return promoted
+
+async def hand_over_seat(db: AsyncSession, class_id: int, exclude_id: Optional[int] = None) -> Optional[int]:
+    """Give a freed seat to the waitlist, or back to the class if nobody is waiting"""
+    promoted = await promote_waitlisted(db, class_id, exclude_id)
+    if promoted is None:
+        await release_seat(db, class_id)
+    return promoted
@@ -0,0 +1,85 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from typing import Iterable, Optional
+import os
+from dotenv import load_dotenv
+
+from cache import TTLCache
+from database import Class, Dojo
+from versions import current_versions
+
+load_dotenv()
+
+# Read-through cache of class and dojo rows for validation lookups (booking,
+# enrollment and check-in paths). Entries are immutable column Rows fetched
+# lazily and shared by every request in the worker.
+#
+# Invalidation rides on the table_versions counters: class and dojo writes
+# bump them, and a lookup that sees a new version drops every entry of that
+# kind. The writing worker sees the change as soon as its bump job commits,
+# and other workers see it within VERSION_REFRESH_SECONDS after that. Seat counts change on every
+# booking, so they are not cached: current_enrollment is left out of the rows
+# and the seat helpers bump class_seats instead of classes.
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 4096))
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", 300))
+
+CLASS_COLUMNS = (
+    Class.id, Class.name, Class.description, Class.instructor_id, Class.dojo_id,
+    Class.day_of_week, Class.start_time, Class.end_time, Class.max_capacity,
+    Class.belt_level_required, Class.is_active,
+)
+DOJO_COLUMNS = (Dojo.id, Dojo.name, Dojo.address, Dojo.phone, Dojo.email)
+
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL_SECONDS)
+_seen_versions: dict[str, int] = {}
+
+async def _drop_stale_entries(db: AsyncSession) -> None:
+    versions = await current_versions(db)
+    for kind in ("classes", "dojos"):
+        version = versions.get(kind, 0)
+        if _seen_versions.get(kind) != version:
+            catalog_cache.invalidate(lambda key: key[0] == kind)
+            _seen_versions[kind] = version
+
+async def get_classes(db: AsyncSession, class_ids: Iterable[int]) -> dict[int, Row]:
+    """Class rows by id; ids with no class are left out"""
+    await _drop_stale_entries(db)
+    found = {}
+    missing = []
+    for class_id in set(class_ids):
+        row = catalog_cache.get(("classes", class_id))
+        if row is None:
+            missing.append(class_id)
+        else:
+            found[class_id] = row
+    if missing:
+        result = await db.execute(select(*CLASS_COLUMNS).where(Class.id.in_(missing)))
+        for row in result.all():
+            catalog_cache.set(("classes", row.id), row)
+            found[row.id] = row
+    return found
+
+async def get_class(db: AsyncSession, class_id: int) -> Optional[Row]:
+    return (await get_classes(db, [class_id])).get(class_id)
+
+async def classes_for_dojo(db: AsyncSession, dojo_id: int) -> tuple[Row, ...]:
+    """Every class at a dojo, in id order"""
+    await _drop_stale_entries(db)
+    key = ("classes", "dojo", dojo_id)
+    rows = catalog_cache.get(key)
+    if rows is None:
+        result = await db.execute(select(*CLASS_COLUMNS).where(Class.dojo_id == dojo_id).order_by(Class.id))
+        rows = tuple(result.all())
+        catalog_cache.set(key, rows)
+    return rows
+
+async def get_dojo(db: AsyncSession, dojo_id: int) -> Optional[Row]:
+    await _drop_stale_entries(db)
+    key = ("dojos", dojo_id)
+    row = catalog_cache.get(key)
+    if row is None:
+        row = (await db.execute(select(*DOJO_COLUMNS).where(Dojo.id == dojo_id))).one_or_none()
+        if row is not None:
+            catalog_cache.set(key, row)
+    return row
@@ -0,0 +1,224 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Date, DateTime, Integer, String, Text, bindparam, exists, func, literal, select, update
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+
+from database import Attendance, Class, Enrollment, Student
+from models import QRCodeScanRequest, QRCodeScanStatus
+from catalog import get_classes
+from queries import dialect_insert
+
+# Largest number of scans accepted by one batch check-in request
+MAX_BATCH_SCANS = 500
+
+ATTENDANCE_COLUMNS = [
+    "student_id", "class_id", "dojo_id", "check_in_time", "check_in_date",
+    "check_in_method", "notes", "checked_in_by",
+]
+# Conflict target for concurrent check-ins of the same student to a class
+ONE_PER_DAY = ["student_id", "class_id", "check_in_date"]
+
+async def check_in(
+    db: AsyncSession,
+    student_criterion,
+    class_id: int,
+    method: str,
+    checked_in_by: int,
+    dojo_id: Optional[int] = None,
+    notes: Optional[str] = None,
+    student_not_found: str = "Student not found",
+) -> Attendance:
+    """Record a check-in with a single INSERT ... SELECT ... RETURNING.
+
+    The SELECT only produces a row when the student matches student_criterion,
+    the class exists and the student has not checked in to the class today, so
+    validation and the insert share one round-trip. Two concurrent scans can
+    both pass that check; the unique index on (student, class, day) then makes
+    the later insert a no-op. The diagnostic queries in check_in_failure only
+    run when nothing was inserted. dojo_id defaults to the student's dojo.
+    """
+    now = datetime.now()
+    today = now.date()
+    already_checked_in = exists().where(
+        Attendance.student_id == Student.id,
+        Attendance.class_id == class_id,
+        Attendance.check_in_time >= today
+    )
+    source = select(
+        Student.id,
+        literal(class_id, Integer),
+        Student.dojo_id if dojo_id is None else literal(dojo_id, Integer),
+        literal(now, DateTime(timezone=True)),
+        literal(today, Date),
+        literal(method, String),
+        literal(notes, Text),
+        literal(checked_in_by, Integer),
+    ).where(
+        student_criterion,
+        exists().where(Class.id == class_id),
+        ~already_checked_in,
+    )
+    result = await db.execute(
+        dialect_insert(Attendance).from_select(ATTENDANCE_COLUMNS, source)
+        .on_conflict_do_nothing(index_elements=ONE_PER_DAY)
+        .returning(Attendance)
+    )
+    attendance = result.scalar_one_or_none()
+    if attendance is None:
+        raise await check_in_failure(db, student_criterion, class_id, student_not_found)
+    await track_attendance(db, [attendance], 1)
+    return attendance
+
+async def check_in_failure(db: AsyncSession, student_criterion, class_id: int, student_not_found: str) -> HTTPException:
+    """Work out why check_in inserted nothing"""
+    if not (await db.execute(select(exists().where(student_criterion)))).scalar():
+        return HTTPException(status_code=404, detail=student_not_found)
+    if not (await db.execute(select(exists().where(Class.id == class_id)))).scalar():
+        return HTTPException(status_code=404, detail="Class not found")
+    return HTTPException(status_code=400, detail="Student already checked in for this class today")
+
+async def check_in_batch(
+    db: AsyncSession,
+    scans: Sequence[QRCodeScanRequest],
+    checked_in_by: int,
+) -> list[tuple[QRCodeScanStatus, Optional[Attendance]]]:
+    """Check in a batch of QR scans with a fixed number of queries.
+
+    Resolves every QR code with one IN query and the classes through the
+    catalog cache, finds today's existing check-ins with one more query, then
+    bulk-inserts the new rows in a single INSERT ... RETURNING. Returns a
+    (status, attendance) pair per scan, in input order. A repeat of an
+    earlier scan in the same batch counts as a duplicate, and so does a row
+    that a concurrent check-in inserted after the lookup (ON CONFLICT DO
+    NOTHING leaves it out of RETURNING).
+    """
+    now = datetime.now()
+    today = now.date()
+    qr_codes = {scan.qr_code for scan in scans}
+    class_ids = {scan.class_id for scan in scans}
+    
+    result = await db.execute(
+        select(Student.qr_code, Student.id, Student.dojo_id).where(Student.qr_code.in_(qr_codes))
+    )
+    students = {qr_code: (student_id, dojo_id) for qr_code, student_id, dojo_id in result.all()}
+    
+    existing_classes = set(await get_classes(db, class_ids))
+    
+    checked_in = set()
+    student_ids = {student_id for student_id, _ in students.values()}
+    if student_ids and existing_classes:
+        result = await db.execute(
+            select(Attendance.student_id, Attendance.class_id).where(
+                Attendance.student_id.in_(student_ids),
+                Attendance.class_id.in_(existing_classes),
+                Attendance.check_in_time >= today
+            )
+        )
+        checked_in = set(result.all())
+    
+    statuses = []
+    rows = []
+    for scan in scans:
+        student = students.get(scan.qr_code)
+        if student is None:
+            statuses.append(QRCodeScanStatus.STUDENT_NOT_FOUND)
+        elif scan.class_id not in existing_classes:
+            statuses.append(QRCodeScanStatus.CLASS_NOT_FOUND)
+        elif (student[0], scan.class_id) in checked_in:
+            statuses.append(QRCodeScanStatus.DUPLICATE)
+        else:
+            checked_in.add((student[0], scan.class_id))
+            statuses.append(QRCodeScanStatus.CHECKED_IN)
+            rows.append({
+                "student_id": student[0],
+                "class_id": scan.class_id,
+                "dojo_id": student[1],
+                "check_in_time": now,
+                "check_in_date": today,
+                "check_in_method": "qr_code",
+                "checked_in_by": checked_in_by,
+            })
+    
+    created = {}
+    if rows:
+        result = await db.execute(
+            dialect_insert(Attendance).on_conflict_do_nothing(index_elements=ONE_PER_DAY).returning(Attendance),
+            rows
+        )
+        records = result.scalars().all()
+        await track_attendance(db, records, 1)
+        created = {(record.student_id, record.class_id): record for record in records}
+    
+    results = []
+    for scan, status in zip(scans, statuses):
+        attendance = None
+        if status == QRCodeScanStatus.CHECKED_IN:
+            attendance = created.get((students[scan.qr_code][0], scan.class_id))
+            if attendance is None:
+                status = QRCodeScanStatus.DUPLICATE
+        results.append((status, attendance))
+    return results
+
+# Enrollment.attendance_count is kept in step with the attendance table: it
+# counts the student's check-ins to the class from the enrollment_date of the
+# enrolled enrollment on. Every such check-in adds one and every deleted one
+# takes one away, in the caller's transaction; check-ins from before the
+# enrollment (an earlier enrollment, or before this one started) never touch
+# it. reconcile_attendance_counts recounts by the same rule. The daily rollup
+# is not urgent and is queued by the routes after they commit.
+
+async def track_attendance(db: AsyncSession, records: Sequence, delta: int) -> None:
+    """Update enrollment attendance counts after records were added (1) or deleted (-1)"""
+    await adjust_attendance_counts(
+        db, [(record.student_id, record.class_id, record.check_in_time) for record in records], delta
+    )
+
+_adjust_enrollment_count = (
+    update(Enrollment.__table__)
+    .where(
+        Enrollment.student_id == bindparam("b_student_id"),
+        Enrollment.class_id == bindparam("b_class_id"),
+        Enrollment.status == "enrolled",
+        Enrollment.enrollment_date <= bindparam("b_check_in_time"),
+    )
+)
+
+async def adjust_attendance_counts(
+    db: AsyncSession, check_ins: Iterable[tuple[int, int, datetime]], delta: int
+) -> None:
+    """Add delta to the enrolled enrollment counting each (student_id, class_id, check_in_time)"""
+    params = [
+        {"b_student_id": student_id, "b_class_id": class_id, "b_check_in_time": check_in_time}
+        for student_id, class_id, check_in_time in check_ins
+    ]
+    if not params:
+        return
+    stmt = _adjust_enrollment_count.values(
+        attendance_count=func.coalesce(Enrollment.attendance_count, 0) + delta
+    )
+    if delta < 0:
+        # Never count below zero, e.g. for check-ins recorded before counting began
+        stmt = stmt.where(Enrollment.attendance_count >= -delta)
+    await db.execute(stmt, params)
+
+async def reconcile_attendance_counts(db: AsyncSession) -> int:
+    """Recount attendance for every enrolled enrollment, returning how many counters changed"""
+    recorded = (
+        select(func.count())
+        .where(
+            Attendance.student_id == Enrollment.student_id,
+            Attendance.class_id == Enrollment.class_id,
+            Attendance.check_in_time >= Enrollment.enrollment_date,
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Enrollment.__table__)
+        .where(
+            Enrollment.status == "enrolled",
+            func.coalesce(Enrollment.attendance_count, -1) != recorded,
+        )
+        .values(attendance_count=recorded)
+    )
+    return result.rowcount
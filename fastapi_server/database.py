@@ -1,21 +1,169 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Index, Text, delete, event, insert, select, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.sql import func
-from typing import AsyncGenerator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Optional
+from datetime import date
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows: no lock file, run a single process for the first boot
+    fcntl = None
+
 load_dotenv()
 
+# Bump whenever the models change so existing databases are migrated on the
+# next start. Databases already at this version skip migration entirely.
+SCHEMA_VERSION = 3
+# Indexes earlier schema versions created that migrate drops again
+DROPPED_INDEXES = [
+    "ix_enrollments_class_status",  # prefix of ix_enrollments_class_status_date
+]
+# pg_advisory_xact_lock key serializing migrations across processes
+MIGRATION_LOCK_KEY = 0x646F6A6F
+# Add the demo dojo and test users to an empty database (development only)
+SEED_DATA = os.getenv("SEED_DATA", "false").lower() == "true"
+
 # Database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
 # Convert to async URL for PostgreSQL
 if DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+class EngineSettings(BaseSettings):
+    """Connection pool and engine tuning, read from DB_* environment variables"""
+
+    model_config = SettingsConfigDict(env_prefix="DB_")
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    # asyncpg prepared statement cache; set to 0 behind pgbouncer in transaction mode
+    statement_cache_size: int = 100
+    echo: bool = False
+    # SQLite file databases: pragmas applied to every new connection
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000  # negative means KiB, so 64 MB per connection
+    sqlite_busy_timeout: int = 5000  # milliseconds
+    # Route all SQLite writes through one connection (see RoutingSession)
+    sqlite_single_writer: bool = True
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited for a connection"""
+
+    # Called with (pool, seconds) after every checkout; see metrics.py
+    checkout_observers: list[Callable[["TimedQueuePool", float], None]] = []
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            for observer in self.checkout_observers:
+                observer(self, waited)
+
+def is_sqlite_file(url: str) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def engine_options(url: str, settings: EngineSettings) -> dict:
+    """Keyword arguments for create_async_engine for this URL.
+
+    In-memory SQLite keeps its single static connection, so pool sizing does
+    not apply. SQLite files get a pooled reader engine here; writes go
+    through writer_engine.
+    """
+    options = {"echo": settings.echo}
+    if make_url(url).get_backend_name() == "sqlite" and not is_sqlite_file(url):
+        return options
+    options["poolclass"] = TimedQueuePool
+    options.update(
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_pre_ping=settings.pool_pre_ping,
+        pool_recycle=settings.pool_recycle,
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.statement_cache_size,
+            "statement_cache_size": settings.statement_cache_size,
+        }
+    return options
+
+def install_sqlite_pragmas(target, settings: EngineSettings):
+    """Apply the SQLite pragmas from settings whenever target opens a connection"""
+    pragmas = [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(settings.sqlite_cache_size)}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}",
+    ]
+
+    @event.listens_for(target.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+class RoutingSession(Session):
+    """Session that sends writes to writer_engine and reads to engine.
+
+    SQLite allows one writer at a time, so funnelling every flush and DML
+    statement through a single pooled connection queues writers in-process
+    instead of failing with "database is locked". Once a transaction has
+    written, its later reads also use the writer so they see their own
+    uncommitted changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase) or self.info.get("wrote"):
+            self.info["wrote"] = True
+            return writer_engine.sync_engine
+        return engine.sync_engine
+
+engine_settings = EngineSettings()
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL, engine_settings))
+if is_sqlite_file(DATABASE_URL):
+    install_sqlite_pragmas(engine, engine_settings)
+if is_sqlite_file(DATABASE_URL) and engine_settings.sqlite_single_writer:
+    writer_engine = create_async_engine(
+        DATABASE_URL,
+        echo=engine_settings.echo,
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=engine_settings.pool_timeout,
+    )
+    install_sqlite_pragmas(writer_engine, engine_settings)
+    AsyncSessionLocal = sessionmaker(
+        class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False
+    )
+else:
+    writer_engine = engine
+    AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def reset_write_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("wrote", None)
 
 Base = declarative_base()
 
@@ -47,8 +195,8 @@ class Student(Base):
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    parent_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    parent_id = Column(Integer, ForeignKey("users.id"), index=True)
     dojo_id = Column(Integer, ForeignKey("dojos.id"), nullable=False)
     belt_level = Column(String, nullable=False, default="white")
     age = Column(Integer)
@@ -63,7 +211,7 @@ class Class(Base):
     name = Column(String, nullable=False)
     description = Column(Text)
     instructor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    dojo_id = Column(Integer, ForeignKey("dojos.id"), nullable=False)
+    dojo_id = Column(Integer, ForeignKey("dojos.id"), nullable=False, index=True)
     day_of_week = Column(String, nullable=False)
     start_time = Column(String, nullable=False)
     end_time = Column(String, nullable=False)
@@ -75,6 +223,10 @@ class Class(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Duplicate-booking checks, cancellation by class/student and active bookings per student
+        Index("ix_bookings_student_class_active", "student_id", "class_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -86,6 +238,13 @@ class Booking(Base):
 
 class Enrollment(Base):
     __tablename__ = "enrollments"
+    __table_args__ = (
+        # Duplicate-enrollment checks and a student's enrollments
+        Index("ix_enrollments_student_class_status", "student_id", "class_id", "status"),
+        # Enrolled/waitlisted counts per class (on the class_id, status
+        # prefix) and a class's waitlist in the order students joined it
+        Index("ix_enrollments_class_status_date", "class_id", "status", "enrollment_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -101,19 +260,80 @@ class Enrollment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+def _check_in_date(context) -> date:
+    check_in_time = context.get_current_parameters().get("check_in_time")
+    return check_in_time.date() if check_in_time is not None else date.today()
+
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # Same-day duplicate check-in lookups and a student's attendance history
+        Index("ix_attendance_student_class_check_in", "student_id", "class_id", "check_in_time"),
+        # One check-in per student, class and day, even for concurrent scans.
+        # Rows recorded before check_in_date existed have NULL there and are
+        # not covered.
+        Index("uq_attendance_student_class_date", "student_id", "class_id", "check_in_date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
     dojo_id = Column(Integer, ForeignKey("dojos.id"), nullable=False)
     check_in_time = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Local day of check_in_time, for uq_attendance_student_class_date
+    check_in_date = Column(Date, default=_check_in_date)
     check_in_method = Column(String(20), default="qr_code", nullable=False)
     notes = Column(Text)
     checked_in_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+class AttendanceDaily(Base):
+    """Check-ins per day, class, dojo and method, kept in step with attendance"""
+    __tablename__ = "attendance_daily"
+    __table_args__ = (
+        # Per-dojo dashboards over a date range
+        Index("ix_attendance_daily_dojo_day", "dojo_id", "day"),
+    )
+
+    day = Column(Date, primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.id"), primary_key=True)
+    dojo_id = Column(Integer, ForeignKey("dojos.id"), primary_key=True)
+    check_in_method = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class QRSequence(Base):
+    """Next number to use in a dojo's student QR codes"""
+    __tablename__ = "qr_sequences"
+
+    dojo_id = Column(Integer, ForeignKey("dojos.id"), primary_key=True)
+    next_number = Column(Integer, nullable=False)
+
+class UserTokenVersion(Base):
+    """Per-user token version; bumping it revokes the user's existing tokens"""
+    __tablename__ = "user_token_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class SchemaVersion(Base):
+    """Single row recording which SCHEMA_VERSION the database was migrated to"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+class TableVersion(Base):
+    """Change counter per catalog table, used to build ETags"""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# Tables whose writes bump a TableVersion row
+# class_seats tracks Class.current_enrollment, which changes far more often
+# than the rest of a class row.
+VERSIONED_TABLES = ("classes", "class_seats", "dojos", "students")
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         try:
@@ -121,19 +341,134 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
-async def init_db():
-    async with engine.begin() as conn:
-        # Create all tables
-        await conn.run_sync(Base.metadata.create_all)
-        
-        # Seed initial data if tables are empty
-        async with AsyncSessionLocal() as session:
-            # Check if we have any users
-            result = await session.execute(text("SELECT COUNT(*) FROM users"))
-            user_count = result.scalar()
-            
-            if user_count == 0:
-                await seed_data(session)
+def pool_stats(target=None) -> dict:
+    """Snapshot of an engine's connection pool (the app engine by default).
+
+    Counts are None for pools that do not track them, such as SQLite's.
+    """
+    pool = (target or engine).sync_engine.pool
+    def count(name: str) -> Optional[int]:
+        method = getattr(pool, name, None)
+        return method() if method else None
+    return {
+        "poolClass": type(pool).__name__,
+        "size": count("size"),
+        "checkedIn": count("checkedin"),
+        "checkedOut": count("checkedout"),
+        "overflow": count("overflow"),
+        "maxOverflow": getattr(pool, "_max_overflow", None),
+        "timeoutSeconds": count("timeout"),
+    }
+
+def create_missing_indexes(connection) -> list[str]:
+    """Create any declared index that an existing database does not have yet.
+
+    create_all only emits indexes together with a new table, so databases
+    created before an index was added need this. Safe to run repeatedly.
+    """
+    created = []
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if not connection.dialect.has_index(connection, table.name, index.name):
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+def add_missing_columns(connection) -> list[str]:
+    """Add declared columns that an existing table does not have yet.
+
+    create_all leaves existing tables alone. Added columns must be nullable,
+    since existing rows get NULL.
+    """
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not connection.dialect.has_table(connection, table.name):
+            continue
+        existing = {column["name"] for column in connection.dialect.get_columns(connection, table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+@asynccontextmanager
+async def migration_lock() -> AsyncGenerator[None, None]:
+    """Hold a lock file next to a SQLite database so one process migrates at a time.
+
+    PostgreSQL uses an advisory lock inside the migration and seed transactions
+    instead, and in-memory SQLite belongs to a single process.
+    """
+    if fcntl is None or not is_sqlite_file(DATABASE_URL):
+        yield
+        return
+    with open(make_url(DATABASE_URL).database + ".migrate-lock", "a") as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _read_schema_version(connection) -> Optional[int]:
+    if not connection.dialect.has_table(connection, SchemaVersion.__tablename__):
+        return None
+    return connection.execute(select(SchemaVersion.version)).scalar()
+
+async def schema_version() -> Optional[int]:
+    """The database's recorded schema version, or None before the first migration"""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(select(SchemaVersion.version))).scalar()
+    except DBAPIError:
+        return None
+
+async def migrate(skip_if_current: bool = False) -> Optional[list[str]]:
+    """Create missing tables, columns and indexes, returning the names of new indexes.
+
+    Runs under the migration lock, so concurrent callers take turns. With
+    skip_if_current, a caller that finds SCHEMA_VERSION already recorded (for
+    example because another worker just migrated) returns None untouched.
+    """
+    async with migration_lock():
+        async with writer_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_KEY)))
+            if skip_if_current and await conn.run_sync(_read_schema_version) == SCHEMA_VERSION:
+                return None
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(add_missing_columns)
+            created = await conn.run_sync(create_missing_indexes)
+            for name in DROPPED_INDEXES:
+                await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            existing = set((await conn.execute(select(TableVersion.name))).scalars())
+            missing = [name for name in VERSIONED_TABLES if name not in existing]
+            if missing:
+                await conn.execute(insert(TableVersion), [{"name": name, "version": 0} for name in missing])
+            await conn.execute(delete(SchemaVersion))
+            await conn.execute(insert(SchemaVersion).values(id=1, version=SCHEMA_VERSION))
+            return created
+
+async def init_db(seed: Optional[bool] = None) -> bool:
+    """Migrate the database if it is behind SCHEMA_VERSION, returning True if it was.
+
+    An up-to-date database costs a single SELECT, so every worker can call this
+    on startup. seed (default SEED_DATA) adds the demo dojo and test users to a
+    database without users; it is meant for development and tests only.
+    """
+    migrated = False
+    if await schema_version() != SCHEMA_VERSION:
+        migrated = await migrate(skip_if_current=True) is not None
+    
+    if SEED_DATA if seed is None else seed:
+        async with migration_lock():
+            async with AsyncSessionLocal() as session:
+                if engine.dialect.name == "postgresql":
+                    # Held until seed_data commits, or the session closes
+                    await session.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_KEY)))
+                result = await session.execute(text("SELECT COUNT(*) FROM users"))
+                if result.scalar() == 0:
+                    await seed_data(session)
+    return migrated
 
 async def seed_data(session: AsyncSession):
     """Seed initial data for testing"""
@@ -0,0 +1,114 @@
+from typing import Awaitable, Callable, NamedTuple, Optional
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+# In-process queue for work a request does not need to wait for, run after
+# the request has committed. main.py starts the workers on startup and drains
+# the queue on shutdown. Jobs open their own database session.
+#
+# The queue is bounded: when it is full, or before start() and after stop()
+# (tests, scripts, shutdown), enqueue runs the job in the caller instead, so
+# work is delayed but never dropped. A failing job is retried with backoff
+# and logged once it runs out of attempts. Queued jobs are lost if the
+# process dies, so only enqueue work that a maintenance command can redo
+# (see manage.py).
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 1000))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 0.1))
+# Seconds shutdown waits for queued jobs before abandoning them
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", 10))
+
+logger = logging.getLogger(__name__)
+
+class Job(NamedTuple):
+    name: str
+    func: Callable[..., Awaitable[None]]
+    args: tuple
+    enqueued_at: float
+
+class JobQueue:
+    """Bounded asyncio queue worked by a fixed set of tasks"""
+
+    def __init__(self, maxsize: int, workers: int, max_attempts: int, retry_delay: float):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def start(self) -> None:
+        """Start the workers on the running event loop"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._work(self._queue)) for _ in range(self.workers)]
+        metrics.job_queue_depth.set(0)
+
+    async def stop(self, timeout: float = JOB_DRAIN_TIMEOUT) -> None:
+        """Wait up to timeout seconds for queued jobs to finish, then stop the workers"""
+        if self._queue is None:
+            return
+        # Jobs enqueued from here on run inline
+        queue, self._queue = self._queue, None
+        try:
+            await asyncio.wait_for(queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Abandoning %d queued jobs at shutdown", queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        metrics.job_queue_depth.set(0)
+
+    async def enqueue(self, name: str, func: Callable[..., Awaitable[None]], *args) -> None:
+        """Run func(*args) in the background, or now if the queue is stopped or full"""
+        job = Job(name, func, args, time.perf_counter())
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                metrics.jobs_inline.inc(name)
+            else:
+                metrics.job_queue_depth.set(self._queue.qsize())
+                return
+        await self._run(job)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            job = await queue.get()
+            metrics.job_queue_depth.set(queue.qsize())
+            metrics.job_queue_lag.observe(time.perf_counter() - job.enqueued_at, job.name)
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await job.func(*job.args)
+            except Exception:
+                if attempt == self.max_attempts:
+                    logger.exception("Job %s failed after %d attempts", job.name, attempt)
+                    metrics.jobs_total.inc(job.name, "failed")
+                    return
+                metrics.jobs_total.inc(job.name, "retried")
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                metrics.jobs_total.inc(job.name, "succeeded")
+                return
+
+job_queue = JobQueue(JOB_QUEUE_SIZE, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY)
@@ -1,13 +1,21 @@
+import time
+
+# Cold start is measured from here (before the framework and app imports) to
+# the end of the startup event, when the first request can be served
+BOOT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
-import uvicorn
-import os
 from dotenv import load_dotenv
 
 from database import init_db
 from routes import router
 from models import HealthResponse
+from pagination import NEXT_CURSOR_HEADER
+from jobs import job_queue
+import metrics
+import querycount
 
 load_dotenv()
 
@@ -24,15 +32,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Request latency and SQL metrics, served on /metrics
+if metrics.METRICS_ENABLED:
+    metrics.install()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return metrics.metrics_response()
+
+# Development aid: warn when a request repeats the same SQL statement
+if querycount.QUERY_REPEAT_WARNING > 0:
+    app.add_middleware(querycount.RepeatedQueryMiddleware)
+
 # Include API routes
 app.include_router(router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database on startup; a database already at SCHEMA_VERSION costs one SELECT"""
+    init_started = time.perf_counter()
     await init_db()
+    app.state.init_db_seconds = time.perf_counter() - init_started
+    job_queue.start()
+    app.state.startup_seconds = time.perf_counter() - BOOT_STARTED
+    metrics.startup_seconds.set(app.state.startup_seconds)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish queued background jobs before the worker exits"""
+    await job_queue.stop()
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -105,10 +137,5 @@ async def not_found_handler(request: Request, exc):
     return JSONResponse(status_code=404, content={"message": "Not found"})
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True
-    ) 
\ No newline at end of file
+    from serve import main
+    main()
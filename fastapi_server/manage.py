@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the FastAPI server database
+"""
+import argparse
+import asyncio
+
+import database
+
+async def migrate(args):
+    created = await database.migrate()
+    if created:
+        print("Created indexes: " + ", ".join(created))
+    else:
+        print("Schema is up to date")
+
+async def reconcile_attendance(args):
+    from checkin import reconcile_attendance_counts
+    async with database.AsyncSessionLocal() as session:
+        changed = await reconcile_attendance_counts(session)
+        await session.commit()
+    print(f"Updated attendance counts on {changed} enrollments")
+
+async def rebuild_attendance_stats(args):
+    from rollups import rebuild_daily_counts
+    async with database.AsyncSessionLocal() as session:
+        written = await rebuild_daily_counts(session)
+        await session.commit()
+    print(f"Rebuilt attendance_daily with {written} rows")
+
+async def bump_versions(args):
+    from versions import bump_versions
+    await bump_versions(*database.VERSIONED_TABLES)
+    print("Bumped table versions: " + ", ".join(database.VERSIONED_TABLES))
+
+COMMANDS = {
+    "migrate": (migrate, "Create missing tables and indexes on an existing database"),
+    "reconcile-attendance": (reconcile_attendance, "Recount Enrollment.attendance_count from the attendance table"),
+    "rebuild-attendance-stats": (rebuild_attendance_stats, "Recompute the attendance_daily rollup from the attendance table"),
+    "bump-versions": (bump_versions, "Bump every table version, invalidating all catalog ETags"),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command][0](args))
@@ -0,0 +1,234 @@
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+import os
+import time
+from dotenv import load_dotenv
+
+from database import TimedQueuePool, engine, writer_engine, pool_stats
+
+load_dotenv()
+
+# Request and database metrics in the Prometheus text format, served on
+# /metrics. MetricsMiddleware times every HTTP request and labels it with the
+# route template, so /api/students/1 and /api/students/2 share a series. The
+# engine event hooks add each statement and its execution time to the request
+# that issued it, tracked through a context variable. Each worker process
+# keeps its own numbers; Prometheus sums them across workers when scraping
+# each one.
+#
+# Recording is a few dict lookups and additions per request and per statement.
+# benchmarks/bench_metrics.py measures the overhead.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+JOB_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labels, labels), value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+class Histogram:
+    """Histogram with fixed buckets; an observation is one bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else _format_value(float(bound))) + '"'
+                yield self.name + "_bucket", _format_labels(self.labels, labels, le), cumulative
+            yield self.name + "_sum", _format_labels(self.labels, labels), series[-1]
+            yield self.name + "_count", _format_labels(self.labels, labels), cumulative
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", LATENCY_BUCKETS, ("method", "route")
+)
+requests_in_progress = Gauge("http_requests_in_progress", "HTTP requests being handled")
+request_queries = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", QUERY_COUNT_BUCKETS, ("method", "route")
+)
+request_db_time = Histogram(
+    "db_time_per_request_seconds", "Time spent executing SQL per HTTP request", LATENCY_BUCKETS, ("method", "route")
+)
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waited for a pooled connection", POOL_WAIT_BUCKETS, ("pool",)
+)
+pool_checked_out = Gauge("db_pool_checked_out", "Connections checked out of the pool", ("pool",))
+pool_overflow = Gauge("db_pool_overflow", "Connections open beyond the pool size", ("pool",))
+startup_seconds = Gauge("process_startup_seconds", "Seconds from importing the app to the end of startup")
+job_queue_depth = Gauge("job_queue_depth", "Background jobs waiting in the queue")
+job_queue_lag = Histogram(
+    "job_queue_lag_seconds", "Time a background job waited in the queue before starting", JOB_LAG_BUCKETS, ("job",)
+)
+jobs_total = Counter("jobs_total", "Background job attempts by outcome", ("job", "outcome"))
+jobs_inline = Counter("jobs_inline_total", "Background jobs run by the caller because the queue was full", ("job",))
+
+REGISTRY = (
+    requests_total, request_duration, requests_in_progress, request_queries,
+    request_db_time, pool_checkout_wait, pool_checked_out, pool_overflow, startup_seconds,
+    job_queue_depth, job_queue_lag, jobs_total, jobs_inline,
+)
+
+requests_in_progress.set(0)
+job_queue_depth.set(0)
+
+# [statements, seconds] for the request being handled, if any
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def pool_name(pool) -> str:
+    if writer_engine is not engine and pool is writer_engine.sync_engine.pool:
+        return "writer"
+    return "default"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            stats[1] += time.perf_counter() - started
+
+def _record_checkout_wait(pool, waited: float) -> None:
+    pool_checkout_wait.observe(waited, pool_name(pool))
+
+def install() -> None:
+    """Start recording statements and pool waits"""
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    if _record_checkout_wait not in TimedQueuePool.checkout_observers:
+        TimedQueuePool.checkout_observers.append(_record_checkout_wait)
+
+_route_paths: dict = {}
+
+def route_label(scope) -> str:
+    """The route template that handled the request, or "unmatched" """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths.setdefault(route.endpoint, route.path)
+        path = _route_paths.get(endpoint, "unmatched")
+    return path
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and SQL per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        requests_in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_progress.dec()
+            _request_db.reset(token)
+            method = scope["method"]
+            route = route_label(scope)
+            requests_total.inc(method, route, status)
+            request_duration.observe(elapsed, method, route)
+            request_queries.observe(stats[0], method, route)
+            request_db_time.observe(stats[1], method, route)
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    pools = {"default": engine}
+    if writer_engine is not engine:
+        pools["writer"] = writer_engine
+    for name, target in pools.items():
+        stats = pool_stats(target)
+        if stats["checkedOut"] is not None:
+            pool_checked_out.set(stats["checkedOut"], name)
+            pool_overflow.set(max(stats["overflow"], 0), name)
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def metrics_response() -> Response:
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 # Enums
@@ -83,7 +83,8 @@ class StudentBase(BaseModel):
     age: Optional[int] = None
 
 class StudentCreate(StudentBase):
-    pass
+    class Config:
+        populate_by_name = True
 
 class StudentUpdate(BaseModel):
     user_id: Optional[int] = Field(None, alias="userId")
@@ -232,6 +233,79 @@ class QRCodeScanRequest(BaseModel):
             raise ValueError('Invalid QR code format')
         return v
 
+class CacheStats(BaseModel):
+    size: int
+    max_size: int = Field(..., alias="maxSize")
+    ttl_seconds: float = Field(..., alias="ttlSeconds")
+    hits: int
+    misses: int
+    hit_rate: float = Field(..., alias="hitRate")
+
+class PoolStats(BaseModel):
+    pool_class: str = Field(..., alias="poolClass")
+    size: Optional[int] = None
+    checked_in: Optional[int] = Field(None, alias="checkedIn")
+    checked_out: Optional[int] = Field(None, alias="checkedOut")
+    overflow: Optional[int] = None
+    max_overflow: Optional[int] = Field(None, alias="maxOverflow")
+    timeout_seconds: Optional[float] = Field(None, alias="timeoutSeconds")
+
+class QRCodeScanStatus(str, Enum):
+    CHECKED_IN = "checked_in"
+    DUPLICATE = "duplicate"
+    STUDENT_NOT_FOUND = "student_not_found"
+    CLASS_NOT_FOUND = "class_not_found"
+
+class QRCodeScanResult(BaseModel):
+    qr_code: str = Field(..., alias="qrCode")
+    class_id: int = Field(..., alias="classId")
+    status: QRCodeScanStatus
+    attendance: Optional[Attendance] = None
+
+    class Config:
+        populate_by_name = True
+
+class AttendanceStatsPeriod(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+
+class AttendanceStatsGroup(str, Enum):
+    CLASS = "class"
+    DOJO = "dojo"
+    METHOD = "method"
+
+class AttendanceStat(BaseModel):
+    """Check-ins in one period; dimensions not grouped by are null"""
+    period_start: date = Field(..., alias="periodStart")
+    class_id: Optional[int] = Field(None, alias="classId")
+    dojo_id: Optional[int] = Field(None, alias="dojoId")
+    check_in_method: Optional[CheckInMethod] = Field(None, alias="checkInMethod")
+    count: int
+
+    class Config:
+        populate_by_name = True
+
+class ScheduleEntry(BaseModel):
+    """An active class in a dojo's weekly schedule"""
+    class_id: int = Field(..., alias="classId")
+    name: str
+    instructor_id: int = Field(..., alias="instructorId")
+    day_of_week: DayOfWeek = Field(..., alias="dayOfWeek")
+    start_time: str = Field(..., alias="startTime")
+    end_time: str = Field(..., alias="endTime")
+    belt_level_required: str = Field(..., alias="beltLevelRequired")
+    starts_at: Optional[datetime] = Field(None, alias="startsAt")
+    ends_at: Optional[datetime] = Field(None, alias="endsAt")
+
+    class Config:
+        populate_by_name = True
+
+class ScheduleNow(BaseModel):
+    """Classes running at a moment and the next one to start"""
+    at: datetime
+    current: List[ScheduleEntry]
+    next: Optional[ScheduleEntry] = None
+
 class HealthResponse(BaseModel):
     status: str = "ok"
     message: str = "YOLO Dojo API running"
@@ -0,0 +1,61 @@
+from fastapi import HTTPException, Query, Response
+from sqlalchemy.sql import Select
+from typing import Any, Callable, Optional, Sequence
+import base64
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Page sizes for list endpoints. Clients follow the X-Next-Cursor header to
+# fetch the next page; it is absent on the last page.
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class PageParams:
+    """Query parameters shared by every paginated list endpoint"""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+def encode_cursor(value: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """The id a cursor points after; every paginated list is keyed by an integer id"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != 1:
+            raise ValueError
+        value = values[0]
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError
+        return value
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(stmt: Select, page: PageParams, key, descending: bool = False) -> Select:
+    """Order stmt by a unique key and restrict it to the rows after page.cursor.
+
+    One extra row is fetched so finish_page can tell whether another page exists.
+    """
+    if page.cursor is not None:
+        value = decode_cursor(page.cursor)
+        stmt = stmt.where(key < value if descending else key > value)
+    return stmt.order_by(key.desc() if descending else key.asc()).limit(page.limit + 1)
+
+def finish_page(response: Response, rows: Sequence, page: PageParams, key: Callable[[Any], Any]) -> list:
+    """Trim the look-ahead row and advertise the next cursor, if any"""
+    rows = list(rows)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+    return rows
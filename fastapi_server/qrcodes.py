@@ -0,0 +1,39 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+
+from database import QRSequence, Student
+from queries import dialect_insert
+
+# Student QR codes are DOJO:<dojo id>:STUDENT:<number>, numbered per dojo from
+# the qr_sequences table. Allocating n codes is one UPDATE ... RETURNING that
+# moves the dojo's counter past them, so concurrent requests never hand out
+# the same code and the row lock only lasts until the caller commits.
+#
+# A dojo's counter starts after the highest number already used in its codes,
+# which keeps it clear of seeded codes and the older timestamp-based ones.
+
+def qr_code_for(dojo_id: int, number: int) -> str:
+    return f"DOJO:{dojo_id}:STUDENT:{number}"
+
+async def _first_unused_number(db: AsyncSession, dojo_id: int) -> int:
+    prefix = qr_code_for(dojo_id, "")
+    result = await db.execute(select(Student.qr_code).where(Student.qr_code.startswith(prefix)))
+    suffixes = (qr_code[len(prefix):] for qr_code in result.scalars())
+    return max((int(suffix) for suffix in suffixes if suffix.isdigit()), default=0) + 1
+
+async def allocate_qr_codes(db: AsyncSession, dojo_id: int, count: int) -> list[str]:
+    """Reserve count new QR codes for dojo_id in db's transaction"""
+    stmt = (
+        update(QRSequence.__table__)
+        .where(QRSequence.dojo_id == dojo_id)
+        .values(next_number=QRSequence.next_number + count)
+        .returning(QRSequence.next_number)
+    )
+    end = (await db.execute(stmt)).scalar_one_or_none()
+    if end is None:
+        start = await _first_unused_number(db, dojo_id)
+        await db.execute(
+            dialect_insert(QRSequence).values(dojo_id=dojo_id, next_number=start).on_conflict_do_nothing()
+        )
+        end = (await db.execute(stmt)).scalar_one()
+    return [qr_code_for(dojo_id, number) for number in range(end - count, end)]
@@ -0,0 +1,22 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import exists, func, select
+
+from database import engine
+
+# Existence and count checks that let the database do the work instead of
+# loading matching rows into Python just to test or measure them.
+
+async def exists_where(db: AsyncSession, model, *criteria) -> bool:
+    """Return True if any row of model matches all criteria"""
+    result = await db.execute(select(exists().select_from(model).where(*criteria)))
+    return bool(result.scalar())
+
+async def count_where(db: AsyncSession, model, *criteria) -> int:
+    """Return the number of rows of model matching all criteria"""
+    result = await db.execute(select(func.count()).select_from(model).where(*criteria))
+    return result.scalar_one()
+
+def dialect_insert(model):
+    """INSERT for the configured dialect, which offers on_conflict_do_nothing/do_update"""
+    return {"postgresql": postgresql, "sqlite": sqlite}[engine.dialect.name].insert(model)
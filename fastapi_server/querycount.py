@@ -0,0 +1,92 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import os
+import warnings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQL statement counting for query budgets and N+1 detection.
+#
+# count_queries() collects every statement any engine runs while the block is
+# active, including statements run by the app on TestClient's event loop
+# thread, so tests can hold an endpoint to a query budget (see the
+# assert_max_queries fixture in tests/conftest.py).
+#
+# With QUERY_REPEAT_WARNING set (development only), RepeatedQueryMiddleware
+# warns when one request runs the same statement that many times, which is
+# the usual sign of a query inside a loop.
+QUERY_REPEAT_WARNING = int(os.getenv("QUERY_REPEAT_WARNING", 0))
+
+class RepeatedQueryWarning(UserWarning):
+    """One request ran the same SQL statement QUERY_REPEAT_WARNING times"""
+
+class QueryLog:
+    """SQL statements run while a count_queries() block was active"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, times: int = 2) -> dict[str, int]:
+        """Statements that ran at least times times"""
+        return {statement: n for statement, n in Counter(self.statements).items() if n >= times}
+
+    def __str__(self) -> str:
+        return "\n".join(f"{i}. {statement}" for i, statement in enumerate(self.statements, 1))
+
+_active_logs: list[QueryLog] = []
+# (path, statement counts) for the request being handled
+_request_statements: ContextVar[Optional[tuple[str, Counter]]] = ContextVar("request_statements", default=None)
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for log in _active_logs:
+        log.statements.append(statement)
+    request = _request_statements.get()
+    if request is not None:
+        path, counts = request
+        counts[statement] += 1
+        if counts[statement] == QUERY_REPEAT_WARNING:
+            warnings.warn(
+                f"{path} ran this statement {QUERY_REPEAT_WARNING} times in one request "
+                f"(possible N+1 query): {' '.join(statement.split())}",
+                RepeatedQueryWarning,
+            )
+
+def install() -> None:
+    if not event.contains(Engine, "after_cursor_execute", _record_statement):
+        event.listen(Engine, "after_cursor_execute", _record_statement)
+
+@contextmanager
+def count_queries() -> Iterator[QueryLog]:
+    """Collect the SQL statements run inside the block"""
+    install()
+    log = QueryLog()
+    _active_logs.append(log)
+    try:
+        yield log
+    finally:
+        _active_logs.remove(log)
+
+class RepeatedQueryMiddleware:
+    """ASGI middleware warning about statements repeated within one request"""
+
+    def __init__(self, app):
+        self.app = app
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_statements.set((scope["path"], Counter()))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
@@ -0,0 +1,110 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, insert, select
+from collections import Counter
+from datetime import date, timedelta
+from typing import Iterable, Optional, Sequence
+
+from database import AsyncSessionLocal, Attendance, AttendanceDaily
+from queries import dialect_insert
+from models import AttendanceStatsGroup, AttendanceStatsPeriod
+
+# attendance_daily holds check-in counts per (day, class, dojo, method) so the
+# stats endpoint never scans attendance. Every attendance insert or delete
+# queues record_daily_counts after committing, so the stats trail check-ins
+# by the job queue's lag. Jobs may run in any order, since every job adds
+# to the counts. rebuild_daily_counts recomputes the table from attendance
+# for existing data, or after lost or failed jobs.
+
+def _upsert_counts(rows: list[dict]):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the existing count"""
+    stmt = dialect_insert(AttendanceDaily).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in AttendanceDaily.__table__.primary_key],
+        set_={"count": AttendanceDaily.count + stmt.excluded.count},
+    )
+
+async def count_check_ins(db: AsyncSession, records: Iterable, delta: int) -> None:
+    """Add delta to the daily count of each attendance record.
+
+    Both directions are the same additive upsert, so queued +1 and -1 jobs for
+    a row give the same total in whatever order they run; a decrement that
+    overtakes its increment leaves the count briefly negative.
+    """
+    counts = Counter(
+        (record.check_in_time.date(), record.class_id, record.dojo_id, record.check_in_method)
+        for record in records
+    )
+    if not counts:
+        return
+    await db.execute(_upsert_counts([
+        {"day": day, "class_id": class_id, "dojo_id": dojo_id, "check_in_method": method, "count": n * delta}
+        for (day, class_id, dojo_id, method), n in counts.items()
+    ]))
+
+async def record_daily_counts(records: Sequence, delta: int) -> None:
+    """Background job: count_check_ins in a transaction of its own.
+
+    A job that runs out of retries leaves the rollup off by its records until
+    `python manage.py rebuild-attendance-stats` is run.
+    """
+    async with AsyncSessionLocal() as db:
+        await count_check_ins(db, records, delta)
+        await db.commit()
+
+async def rebuild_daily_counts(db: AsyncSession) -> int:
+    """Recompute attendance_daily from attendance, returning the number of rows written"""
+    day = func.date(Attendance.check_in_time)
+    await db.execute(delete(AttendanceDaily))
+    result = await db.execute(
+        insert(AttendanceDaily).from_select(
+            ["day", "class_id", "dojo_id", "check_in_method", "count"],
+            select(day, Attendance.class_id, Attendance.dojo_id, Attendance.check_in_method, func.count())
+            .group_by(day, Attendance.class_id, Attendance.dojo_id, Attendance.check_in_method)
+        )
+    )
+    return result.rowcount
+
+_GROUP_COLUMNS = {
+    AttendanceStatsGroup.CLASS: AttendanceDaily.class_id,
+    AttendanceStatsGroup.DOJO: AttendanceDaily.dojo_id,
+    AttendanceStatsGroup.METHOD: AttendanceDaily.check_in_method,
+}
+
+async def attendance_stats(
+    db: AsyncSession,
+    start: date,
+    end: date,
+    period: AttendanceStatsPeriod,
+    group_by: Sequence[AttendanceStatsGroup],
+    dojo_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+) -> list[dict]:
+    """Check-in counts from start to end inclusive, per period and group_by dimensions.
+
+    Days are summed in SQL; weeks (starting Monday) are folded together here,
+    which keeps the query portable and touches at most one row per day and group.
+    """
+    columns = [_GROUP_COLUMNS[group] for group in dict.fromkeys(group_by)]
+    query = (
+        select(AttendanceDaily.day, *columns, func.sum(AttendanceDaily.count))
+        .where(AttendanceDaily.day >= start, AttendanceDaily.day <= end)
+        .group_by(AttendanceDaily.day, *columns)
+    )
+    if dojo_id is not None:
+        query = query.where(AttendanceDaily.dojo_id == dojo_id)
+    if class_id is not None:
+        query = query.where(AttendanceDaily.class_id == class_id)
+    
+    totals = Counter()
+    for day, *key, count in (await db.execute(query)).all():
+        if period == AttendanceStatsPeriod.WEEK:
+            day -= timedelta(days=day.weekday())
+        totals[(day, *key)] += count
+    
+    names = [column.key for column in columns]
+    return [
+        {"period_start": day, **dict(zip(names, key)), "count": count}
+        for (day, *key), count in sorted(totals.items())
+        # Zero, or negative while a decrement is ahead of its increment
+        if count > 0
+    ]
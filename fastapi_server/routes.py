@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from typing import List
-from datetime import datetime, timedelta
+from sqlalchemy import func, select, update, delete
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import os
 import re
-import time
 
-from database import get_db, User, Student, Dojo, Class, Booking, Attendance, Enrollment
+from database import get_db, pool_stats, AsyncSessionLocal, User, UserTokenVersion, Student, Dojo, Class, Booking, Attendance, Enrollment
 from models import (
     UserCreate, UserUpdate, User as UserModel,
     StudentCreate, StudentUpdate, Student as StudentModel,
@@ -14,13 +15,79 @@ from models import (
     BookingCreate, Booking as BookingModel, StudentBookingWithClass,
     EnrollmentCreate, EnrollmentUpdate, Enrollment as EnrollmentModel, EnrollmentWithClassDetails,
     AttendanceCreate, Attendance as AttendanceModel,
-    LoginRequest, LoginResponse, QRCodeScanRequest,
-    UserRole, CheckInMethod, EnrollmentStatus, HealthResponse
+    AttendanceStat, AttendanceStatsGroup, AttendanceStatsPeriod, ScheduleEntry, ScheduleNow,
+    LoginRequest, LoginResponse, QRCodeScanRequest, QRCodeScanResult,
+    UserRole, CheckInMethod, EnrollmentStatus, HealthResponse, CacheStats, PoolStats
+)
+from pagination import PageParams, paginate, finish_page
+from capacity import reserve_seat, hand_over_seat
+from queries import exists_where, count_where
+from checkin import check_in, check_in_batch, track_attendance, MAX_BATCH_SCANS
+from rollups import attendance_stats, record_daily_counts
+from jobs import job_queue
+from qrcodes import allocate_qr_codes
+from student_import import import_students, csv_rows, json_rows
+from serialize import columns_for, json_list, dump_lines
+from versions import bump_after_commit, make_etag, not_modified, publish_version_bumps
+import catalog
+import schedule
+from auth import (
+    require_auth, require_role, create_access_token, verify_password_async, get_password_hash_async,
+    invalidate_cached_user, user_cache, user_claims, revoke_user_tokens
 )
-from auth import require_auth, require_role, create_access_token, verify_password, get_password_hash
 
 router = APIRouter()
 
+# Rows fetched per round-trip by the streaming export endpoints
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+def attendance_to_model(record: Attendance) -> AttendanceModel:
+    return AttendanceModel(
+        id=record.id,
+        studentId=record.student_id,
+        classId=record.class_id,
+        dojoId=record.dojo_id,
+        checkInTime=record.check_in_time,
+        checkInMethod=CheckInMethod(record.check_in_method),
+        notes=record.notes,
+        checkedInBy=record.checked_in_by,
+        createdAt=record.created_at
+    )
+
+def enrollment_details_query():
+    """Enrollments joined to their class, instructor and dojo.
+
+    Each column is labelled with its EnrollmentWithClassDetails field name so
+    rows validate straight into the model.
+    """
+    return (
+        select(
+            Enrollment.id, Enrollment.student_id, Enrollment.class_id, Enrollment.status,
+            Enrollment.enrolled_by, Enrollment.enrollment_date, Enrollment.start_date,
+            Enrollment.end_date, Enrollment.notes, Enrollment.attendance_count,
+            Enrollment.total_sessions, Enrollment.created_at, Enrollment.updated_at,
+            Class.name.label("class_name"),
+            Class.description.label("class_description"),
+            Class.day_of_week, Class.start_time, Class.end_time, Class.belt_level_required,
+            (User.first_name + " " + User.last_name).label("instructor_name"),
+            Dojo.name.label("dojo_name"),
+        )
+        .join(Class, Enrollment.class_id == Class.id)
+        .join(User, Class.instructor_id == User.id)
+        .join(Dojo, Class.dojo_id == Dojo.id)
+    )
+
+async def stream_ndjson(query, model):
+    """Yield the rows of a column select as NDJSON, one chunk per EXPORT_BATCH_SIZE rows.
+
+    Uses its own session and a server-side cursor so memory stays flat no
+    matter how many rows the query returns.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield dump_lines(model, rows)
+
 # Health check endpoint
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -32,11 +99,15 @@ async def login(
     login_data: LoginRequest,
     db: AsyncSession = Depends(get_db)
 ):
-    # Find user by username
-    result = await db.execute(select(User).where(User.username == login_data.username))
-    user = result.scalar_one_or_none()
+    # Find user by username, with the token version for the new token's claims
+    result = await db.execute(
+        select(User, func.coalesce(UserTokenVersion.version, 0))
+        .outerjoin(UserTokenVersion, UserTokenVersion.user_id == User.id)
+        .where(User.username == login_data.username)
+    )
+    user, token_version = result.one_or_none() or (None, 0)
     
-    if not user or not verify_password(login_data.password, user.password):
+    if not user or not await verify_password_async(login_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
@@ -45,7 +116,7 @@ async def login(
     # Create access token
     access_token_expires = timedelta(minutes=60 * 24)  # 24 hours
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=user_claims(user, token_version), expires_delta=access_token_expires
     )
     
     # Convert to response model
@@ -63,7 +134,16 @@ async def login(
     return LoginResponse(user=user_model, accessToken=access_token)
 
 @router.get("/auth/me", response_model=UserModel)
-async def get_current_user_info(current_user: User = Depends(require_auth)):
+async def get_current_user_info(
+    current_user: User = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    if not isinstance(current_user, User):
+        # Stateless tokens only carry id, role and username
+        result = await db.execute(select(User).where(User.id == current_user.id))
+        current_user = result.scalar_one_or_none()
+        if current_user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
     return UserModel(
         id=current_user.id,
         username=current_user.username,
@@ -78,25 +158,15 @@ async def get_current_user_info(current_user: User = Depends(require_auth)):
 # User management routes
 @router.get("/users", response_model=List[UserModel])
 async def get_all_users(
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR])),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(User))
-    users = result.scalars().all()
+    result = await db.execute(paginate(select(*columns_for(User, UserModel)), page, User.id))
+    users = finish_page(response, result.all(), page, lambda user: user.id)
     
-    return [
-        UserModel(
-            id=user.id,
-            username=user.username,
-            email=user.email,
-            role=UserRole(user.role),
-            firstName=user.first_name,
-            lastName=user.last_name,
-            phone=user.phone,
-            createdAt=user.created_at
-        )
-        for user in users
-    ]
+    return json_list(UserModel, users, response)
 
 @router.get("/users/{user_id}", response_model=UserModel)
 async def get_user(
@@ -137,7 +207,7 @@ async def create_user(
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     # Create user
     user = User(
@@ -189,7 +259,7 @@ async def update_user(
     if user_data.email is not None:
         update_data["email"] = user_data.email
     if user_data.password is not None:
-        update_data["password"] = get_password_hash(user_data.password)
+        update_data["password"] = await get_password_hash_async(user_data.password)
     if user_data.role is not None:
         update_data["role"] = user_data.role.value
     if user_data.first_name is not None:
@@ -202,56 +272,65 @@ async def update_user(
     await db.execute(
         update(User).where(User.id == user_id).values(**update_data)
     )
+    if update_data.keys() & {"username", "password", "role"}:
+        # Tokens carry the username and role, and a new password must sign out
+        # old sessions; get_current_user rejects revoked tokens in either mode
+        await revoke_user_tokens(db, user_id)
     await db.commit()
+    invalidate_cached_user(user_id)
     
-    # Get updated user
-    result = await db.execute(select(User).where(User.id == user_id))
-    updated_user = result.scalar_one()
-    
+    # The ORM UPDATE already applied update_data to the loaded user
     return UserModel(
-        id=updated_user.id,
-        username=updated_user.username,
-        email=updated_user.email,
-        role=UserRole(updated_user.role),
-        firstName=updated_user.first_name,
-        lastName=updated_user.last_name,
-        phone=updated_user.phone,
-        createdAt=updated_user.created_at
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=UserRole(user.role),
+        firstName=user.first_name,
+        lastName=user.last_name,
+        phone=user.phone,
+        createdAt=user.created_at
     )
 
+# Admin routes
+@router.get("/admin/auth-cache", response_model=CacheStats)
+async def get_auth_cache_stats(
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    return CacheStats(**user_cache.stats())
+
+@router.get("/admin/catalog-cache", response_model=CacheStats)
+async def get_catalog_cache_stats(
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    return CacheStats(**catalog.catalog_cache.stats())
+
+@router.get("/admin/pool", response_model=PoolStats)
+async def get_pool_stats(
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    return PoolStats(**pool_stats())
+
 # Student management routes
 @router.get("/students", response_model=List[StudentModel])
 async def get_students(
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
     if current_user.role == "instructor":
         # Instructors can see all students
-        result = await db.execute(select(Student))
-        students = result.scalars().all()
+        query = select(*columns_for(Student, StudentModel))
     elif current_user.role == "parent":
         # Parents can only see their own children
-        result = await db.execute(
-            select(Student).where(Student.parent_id == current_user.id)
-        )
-        students = result.scalars().all()
+        query = select(*columns_for(Student, StudentModel)).where(Student.parent_id == current_user.id)
     else:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    return [
-        StudentModel(
-            id=student.id,
-            userId=student.user_id,
-            parentId=student.parent_id,
-            dojoId=student.dojo_id,
-            beltLevel=student.belt_level,
-            age=student.age,
-            qrCode=student.qr_code,
-            isActive=student.is_active,
-            createdAt=student.created_at
-        )
-        for student in students
-    ]
+    result = await db.execute(paginate(query, page, Student.id))
+    students = finish_page(response, result.all(), page, lambda student: student.id)
+    
+    return json_list(StudentModel, students, response)
 
 @router.get("/students/{student_id}", response_model=StudentModel)
 async def get_student(
@@ -293,9 +372,9 @@ async def create_student(
     if current_user.role == "parent":
         student_data.parent_id = current_user.id
     
-    # Generate unique QR code using timestamp
-    timestamp = int(time.time())
-    qr_code = f"DOJO:1:STUDENT:{timestamp}"
+    if await catalog.get_dojo(db, student_data.dojo_id) is None:
+        raise HTTPException(status_code=404, detail="Dojo not found")
+    qr_code, = await allocate_qr_codes(db, student_data.dojo_id, 1)
     
     student = Student(
         user_id=student_data.user_id,
@@ -307,7 +386,9 @@ async def create_student(
     )
     
     db.add(student)
+    bump_after_commit(db, "students")
     await db.commit()
+    await publish_version_bumps(db)
     await db.refresh(student)
     
     return StudentModel(
@@ -322,6 +403,34 @@ async def create_student(
         createdAt=student.created_at
     )
 
+@router.post("/students/bulk", response_model=List[StudentModel])
+async def bulk_import_students(
+    request: Request,
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR])),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import students from a JSON array or a CSV upload (text/csv, streamed), all or nothing"""
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if content_type == "text/csv":
+        rows = csv_rows(request.stream())
+    elif content_type == "application/json":
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of students")
+        rows = json_rows(body)
+    else:
+        raise HTTPException(status_code=415, detail="Send application/json or text/csv")
+    
+    students = await import_students(db, rows)
+    bump_after_commit(db, "students")
+    await db.commit()
+    await publish_version_bumps(db)
+    
+    return json_list(StudentModel, students)
+
 @router.put("/students/{student_id}", response_model=StudentModel)
 async def update_student(
     student_id: int,
@@ -355,22 +464,21 @@ async def update_student(
     await db.execute(
         update(Student).where(Student.id == student_id).values(**update_data)
     )
+    bump_after_commit(db, "students")
     await db.commit()
+    await publish_version_bumps(db)
     
-    # Get updated student
-    result = await db.execute(select(Student).where(Student.id == student_id))
-    updated_student = result.scalar_one()
-    
+    # The ORM UPDATE already applied update_data to the loaded student
     return StudentModel(
-        id=updated_student.id,
-        userId=updated_student.user_id,
-        parentId=updated_student.parent_id,
-        dojoId=updated_student.dojo_id,
-        beltLevel=updated_student.belt_level,
-        age=updated_student.age,
-        qrCode=updated_student.qr_code,
-        isActive=updated_student.is_active,
-        createdAt=updated_student.created_at
+        id=existing_student.id,
+        userId=existing_student.user_id,
+        parentId=existing_student.parent_id,
+        dojoId=existing_student.dojo_id,
+        beltLevel=existing_student.belt_level,
+        age=existing_student.age,
+        qrCode=existing_student.qr_code,
+        isActive=existing_student.is_active,
+        createdAt=existing_student.created_at
     )
 
 @router.delete("/students/{student_id}")
@@ -391,65 +499,62 @@ async def delete_student(
     
     # Check for related data that might prevent deletion
     # Check for active bookings
-    result = await db.execute(
-        select(Booking).where(
-            Booking.student_id == student_id,
-            Booking.is_active == True
-        )
+    active_bookings = await count_where(
+        db, Booking, Booking.student_id == student_id, Booking.is_active == True
     )
-    active_bookings = result.scalars().all()
     
     if active_bookings:
         raise HTTPException(
             status_code=400, 
-            detail=f"Cannot delete student with {len(active_bookings)} active bookings. Please cancel bookings first."
+            detail=f"Cannot delete student with {active_bookings} active bookings. Please cancel bookings first."
         )
     
     # Check for attendance records
-    result = await db.execute(
-        select(Attendance).where(Attendance.student_id == student_id)
-    )
-    attendance_records = result.scalars().all()
+    attendance_records = await count_where(db, Attendance, Attendance.student_id == student_id)
     
     if attendance_records:
         raise HTTPException(
             status_code=400,
-            detail=f"Cannot delete student with {len(attendance_records)} attendance records. Attendance history must be preserved."
+            detail=f"Cannot delete student with {attendance_records} attendance records. Attendance history must be preserved."
         )
     
     # Delete the student
     await db.execute(delete(Student).where(Student.id == student_id))
+    bump_after_commit(db, "students")
     await db.commit()
+    await publish_version_bumps(db)
     
     return {"message": "Student deleted successfully"}
 
 # Dojo routes
 @router.get("/dojos", response_model=List[DojoModel])
 async def get_dojos(
+    request: Request,
+    response: Response,
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Dojo))
-    dojos = result.scalars().all()
+    cached = not_modified(request, response, await make_etag(request, "dojos", db=db))
+    if cached:
+        return cached
     
-    return [
-        DojoModel(
-            id=dojo.id,
-            name=dojo.name,
-            address=dojo.address,
-            phone=dojo.phone,
-            email=dojo.email,
-            createdAt=dojo.created_at
-        )
-        for dojo in dojos
-    ]
+    result = await db.execute(select(*columns_for(Dojo, DojoModel)))
+    dojos = result.all()
+    
+    return json_list(DojoModel, dojos, response)
 
 @router.get("/dojos/{dojo_id}", response_model=DojoModel)
 async def get_dojo(
     dojo_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
+    cached = not_modified(request, response, await make_etag(request, "dojos", db=db))
+    if cached:
+        return cached
+    
     result = await db.execute(select(Dojo).where(Dojo.id == dojo_id))
     dojo = result.scalar_one_or_none()
     
@@ -465,58 +570,90 @@ async def get_dojo(
         createdAt=dojo.created_at
     )
 
+@router.get("/dojos/{dojo_id}/schedule", response_model=List[ScheduleEntry])
+async def get_dojo_schedule(
+    dojo_id: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Active classes at the dojo in weekly order, Monday first"""
+    cached = not_modified(request, response, await make_etag(request, "classes", db=db))
+    if cached:
+        return cached
+    
+    if await catalog.get_dojo(db, dojo_id) is None:
+        raise HTTPException(status_code=404, detail="Dojo not found")
+    
+    dojo_schedule = await schedule.dojo_schedule(db, dojo_id)
+    return [slot.entry for slot in dojo_schedule.slots]
+
+@router.get("/dojos/{dojo_id}/schedule/now", response_model=ScheduleNow)
+async def get_dojo_schedule_now(
+    dojo_id: int,
+    at: Optional[datetime] = None,
+    current_user: User = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Classes running at the dojo now (or at `at`) and the next one to start"""
+    if await catalog.get_dojo(db, dojo_id) is None:
+        raise HTTPException(status_code=404, detail="Dojo not found")
+    
+    return await schedule.schedule_now(db, dojo_id, at or datetime.now())
+
 # Class management routes
 @router.get("/classes", response_model=List[ClassModel])
 async def get_classes(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
+    # Parents' and students' lists also depend on their students' rows
+    etag = await make_etag(
+        request, "classes", "class_seats", "students", scope=f"{current_user.role}:{current_user.id}", db=db
+    )
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    
     if current_user.role == "instructor":
         # Instructors can see all classes
-        result = await db.execute(select(Class))
-        classes = result.scalars().all()
+        query = select(*columns_for(Class, ClassModel))
     elif current_user.role == "parent":
         # Parents can see classes at their children's dojo
-        result = await db.execute(
-            select(Class).distinct().join(Student, Class.dojo_id == Student.dojo_id)
+        query = (
+            select(*columns_for(Class, ClassModel)).distinct().join(Student, Class.dojo_id == Student.dojo_id)
             .where(Student.parent_id == current_user.id)
         )
-        classes = result.scalars().all()
     else:
         # Students can only see classes they are enrolled in
-        result = await db.execute(
-            select(Class).join(Enrollment, Class.id == Enrollment.class_id)
+        query = (
+            select(*columns_for(Class, ClassModel)).join(Enrollment, Class.id == Enrollment.class_id)
             .join(Student, Enrollment.student_id == Student.id)
             .where(Student.user_id == current_user.id)
             .where(Enrollment.status == "enrolled")
         )
-        classes = result.scalars().all()
     
-    return [
-        ClassModel(
-            id=cls.id,
-            name=cls.name,
-            description=cls.description,
-            instructorId=cls.instructor_id,
-            dojoId=cls.dojo_id,
-            dayOfWeek=cls.day_of_week,
-            startTime=cls.start_time,
-            endTime=cls.end_time,
-            maxCapacity=cls.max_capacity,
-            currentEnrollment=cls.current_enrollment,
-            beltLevelRequired=cls.belt_level_required,
-            isActive=cls.is_active,
-            createdAt=cls.created_at
-        )
-        for cls in classes
-    ]
+    result = await db.execute(paginate(query, page, Class.id))
+    classes = finish_page(response, result.all(), page, lambda cls: cls.id)
+    
+    return json_list(ClassModel, classes, response)
 
 @router.get("/classes/{class_id}", response_model=ClassModel)
 async def get_class(
     class_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
+    cached = not_modified(request, response, await make_etag(request, "classes", "class_seats", db=db))
+    if cached:
+        return cached
+    
     result = await db.execute(select(Class).where(Class.id == class_id))
     cls = result.scalar_one_or_none()
     
@@ -558,8 +695,11 @@ async def create_class(
     )
     
     db.add(cls)
+    bump_after_commit(db, "classes")
     await db.commit()
+    await publish_version_bumps(db)
     await db.refresh(cls)
+    schedule.class_saved(cls)
     
     return ClassModel(
         id=cls.id,
@@ -613,29 +753,31 @@ async def update_class(
     if class_data.is_active is not None:
         update_data["is_active"] = class_data.is_active
     
+    previous_dojo_id = existing_class.dojo_id
     await db.execute(
         update(Class).where(Class.id == class_id).values(**update_data)
     )
+    bump_after_commit(db, "classes")
     await db.commit()
+    await publish_version_bumps(db)
     
-    # Get updated class
-    result = await db.execute(select(Class).where(Class.id == class_id))
-    updated_class = result.scalar_one()
+    # The ORM UPDATE already applied update_data to the loaded class
+    schedule.class_saved(existing_class, previous_dojo_id)
     
     return ClassModel(
-        id=updated_class.id,
-        name=updated_class.name,
-        description=updated_class.description,
-        instructorId=updated_class.instructor_id,
-        dojoId=updated_class.dojo_id,
-        dayOfWeek=updated_class.day_of_week,
-        startTime=updated_class.start_time,
-        endTime=updated_class.end_time,
-        maxCapacity=updated_class.max_capacity,
-        currentEnrollment=updated_class.current_enrollment,
-        beltLevelRequired=updated_class.belt_level_required,
-        isActive=updated_class.is_active,
-        createdAt=updated_class.created_at
+        id=existing_class.id,
+        name=existing_class.name,
+        description=existing_class.description,
+        instructorId=existing_class.instructor_id,
+        dojoId=existing_class.dojo_id,
+        dayOfWeek=existing_class.day_of_week,
+        startTime=existing_class.start_time,
+        endTime=existing_class.end_time,
+        maxCapacity=existing_class.max_capacity,
+        currentEnrollment=existing_class.current_enrollment,
+        beltLevelRequired=existing_class.belt_level_required,
+        isActive=existing_class.is_active,
+        createdAt=existing_class.created_at
     )
 
 @router.delete("/classes/{class_id}")
@@ -650,48 +792,43 @@ async def delete_class(
     if not existing_class:
         raise HTTPException(status_code=404, detail="Class not found")
     
+    dojo_id = existing_class.dojo_id
     await db.execute(delete(Class).where(Class.id == class_id))
+    bump_after_commit(db, "classes")
     await db.commit()
+    await publish_version_bumps(db)
+    schedule.class_deleted(class_id, dojo_id)
     
     return {"message": "Class deleted successfully"}
 
 # Booking routes
 @router.get("/bookings", response_model=List[BookingModel])
 async def get_bookings(
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
     if current_user.role == "instructor":
         # Instructors can see all bookings
-        result = await db.execute(select(Booking))
-        bookings = result.scalars().all()
+        query = select(*columns_for(Booking, BookingModel))
     elif current_user.role == "parent":
         # Parents can see bookings for their children
-        result = await db.execute(
-            select(Booking).join(Student, Booking.student_id == Student.id)
+        query = (
+            select(*columns_for(Booking, BookingModel)).join(Student, Booking.student_id == Student.id)
             .where(Student.parent_id == current_user.id)
         )
-        bookings = result.scalars().all()
     else:
         # Students can see their own bookings
-        result = await db.execute(
-            select(Booking).join(Student, Booking.student_id == Student.id)
+        query = (
+            select(*columns_for(Booking, BookingModel)).join(Student, Booking.student_id == Student.id)
             .where(Student.user_id == current_user.id)
         )
-        bookings = result.scalars().all()
     
-    return [
-        BookingModel(
-            id=booking.id,
-            studentId=booking.student_id,
-            classId=booking.class_id,
-            bookedBy=booking.booked_by,
-            bookedAt=booking.booked_at,
-            isActive=booking.is_active,
-            createdAt=booking.created_at
-        )
-        for booking in bookings
-    ]
+    result = await db.execute(paginate(query, page, Booking.id))
+    bookings = finish_page(response, result.all(), page, lambda booking: booking.id)
+    
+    return json_list(BookingModel, bookings, response)
 
 @router.post("/bookings", response_model=BookingModel)
 async def create_booking(
@@ -700,7 +837,7 @@ async def create_booking(
     db: AsyncSession = Depends(get_db)
 ):
     # Check if student exists and user has permission
-    result = await db.execute(select(Student).where(Student.id == booking_data.studentId))
+    result = await db.execute(select(Student).where(Student.id == booking_data.student_id))
     student = result.scalar_one_or_none()
     
     if not student:
@@ -710,45 +847,34 @@ async def create_booking(
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Check if class exists
-    result = await db.execute(select(Class).where(Class.id == booking_data.classId))
-    cls = result.scalar_one_or_none()
+    cls = await catalog.get_class(db, booking_data.class_id)
     
     if not cls:
         raise HTTPException(status_code=404, detail="Class not found")
     
     # Check if already booked
-    result = await db.execute(
-        select(Booking).where(
-            Booking.student_id == booking_data.studentId,
-            Booking.class_id == booking_data.classId,
-            Booking.is_active == True
-        )
-    )
-    existing_booking = result.scalar_one_or_none()
-    
-    if existing_booking:
+    if await exists_where(
+        db, Booking,
+        Booking.student_id == booking_data.student_id,
+        Booking.class_id == booking_data.class_id,
+        Booking.is_active == True
+    ):
         raise HTTPException(status_code=400, detail="Student already booked for this class")
     
-    # Check class capacity
-    if cls.current_enrollment >= cls.max_capacity:
+    # Take a seat; fails atomically if the class is already full
+    if not await reserve_seat(db, cls.id):
         raise HTTPException(status_code=400, detail="Class is at maximum capacity")
     
     # Create booking
     booking = Booking(
-        student_id=booking_data.studentId,
-        class_id=booking_data.classId,
-        booked_by=booking_data.bookedBy
+        student_id=booking_data.student_id,
+        class_id=booking_data.class_id,
+        booked_by=booking_data.booked_by
     )
     
     db.add(booking)
-    
-    # Update class enrollment
-    await db.execute(
-        update(Class).where(Class.id == cls.id)
-        .values(current_enrollment=cls.current_enrollment + 1)
-    )
-    
     await db.commit()
+    await publish_version_bumps(db)
     await db.refresh(booking)
     
     return BookingModel(
@@ -780,67 +906,55 @@ async def delete_booking(
     if (current_user.role == "parent" and student.parent_id != current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Soft delete booking
-    await db.execute(
-        update(Booking).where(Booking.id == booking_id).values(is_active=False)
-    )
-    
-    # Update class enrollment
-    result = await db.execute(select(Class).where(Class.id == booking.class_id))
-    cls = result.scalar_one()
-    
-    await db.execute(
-        update(Class).where(Class.id == cls.id)
-        .values(current_enrollment=max(0, cls.current_enrollment - 1))
+    # Soft delete booking; only the request that deactivates it frees the seat
+    result = await db.execute(
+        update(Booking).where(Booking.id == booking_id, Booking.is_active == True)
+        .values(is_active=False)
     )
+    if result.rowcount:
+        await hand_over_seat(db, booking.class_id)
     
     await db.commit()
+    await publish_version_bumps(db)
     
     return {"message": "Booking cancelled successfully"}
 
 # Attendance routes
 @router.get("/attendance", response_model=List[AttendanceModel])
 async def get_attendance(
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
     if current_user.role == "instructor":
         # Instructors can see all attendance
-        result = await db.execute(select(Attendance))
-        attendance_records = result.scalars().all()
+        query = select(*columns_for(Attendance, AttendanceModel))
     elif current_user.role == "parent":
         # Parents can see attendance for their children
-        result = await db.execute(
-            select(Attendance).join(Student, Attendance.student_id == Student.id)
+        query = (
+            select(*columns_for(Attendance, AttendanceModel)).join(Student, Attendance.student_id == Student.id)
             .where(Student.parent_id == current_user.id)
         )
-        attendance_records = result.scalars().all()
     else:
         # Students can see their own attendance
-        result = await db.execute(
-            select(Attendance).join(Student, Attendance.student_id == Student.id)
+        query = (
+            select(*columns_for(Attendance, AttendanceModel)).join(Student, Attendance.student_id == Student.id)
             .where(Student.user_id == current_user.id)
         )
-        attendance_records = result.scalars().all()
     
-    return [
-        AttendanceModel(
-            id=record.id,
-            studentId=record.student_id,
-            classId=record.class_id,
-            dojoId=record.dojo_id,
-            checkInTime=record.check_in_time,
-            checkInMethod=CheckInMethod(record.check_in_method),
-            notes=record.notes,
-            checkedInBy=record.checked_in_by,
-            createdAt=record.created_at
-        )
-        for record in attendance_records
-    ]
+    # Newest first. check_in_time is always assigned at insert, so id order
+    # matches check-in order and gives a unique keyset.
+    result = await db.execute(paginate(query, page, Attendance.id, descending=True))
+    attendance_records = finish_page(response, result.all(), page, lambda record: record.id)
+    
+    return json_list(AttendanceModel, attendance_records, response)
 
 @router.get("/students/{student_id}/attendance", response_model=List[AttendanceModel])
 async def get_student_attendance(
     student_id: int,
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
@@ -851,27 +965,34 @@ async def get_student_attendance(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get attendance records for this student
-    result = await db.execute(
-        select(Attendance).where(Attendance.student_id == student_id)
-        .order_by(Attendance.check_in_time.desc())
-    )
-    attendance_records = result.scalars().all()
+    # Get attendance records for this student, newest first
+    result = await db.execute(paginate(
+        select(*columns_for(Attendance, AttendanceModel)).where(Attendance.student_id == student_id),
+        page, Attendance.id, descending=True
+    ))
+    attendance_records = finish_page(response, result.all(), page, lambda record: record.id)
     
-    return [
-        AttendanceModel(
-            id=record.id,
-            studentId=record.student_id,
-            classId=record.class_id,
-            dojoId=record.dojo_id,
-            checkInTime=record.check_in_time,
-            checkInMethod=CheckInMethod(record.check_in_method),
-            notes=record.notes,
-            checkedInBy=record.checked_in_by,
-            createdAt=record.created_at
-        )
-        for record in attendance_records
-    ]
+    return json_list(AttendanceModel, attendance_records, response)
+
+@router.get("/attendance/stats", response_model=List[AttendanceStat])
+async def get_attendance_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    period: AttendanceStatsPeriod = AttendanceStatsPeriod.DAY,
+    group_by: List[AttendanceStatsGroup] = Query([]),
+    dojo_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR])),
+    db: AsyncSession = Depends(get_db)
+):
+    """Check-in counts from the attendance_daily rollup; defaults to the last 30 days"""
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    
+    stats = await attendance_stats(db, start, end, period, group_by, dojo_id=dojo_id, class_id=class_id)
+    return json_list(AttendanceStat, stats)
 
 @router.post("/attendance/qr-scan", response_model=AttendanceModel)
 async def qr_code_scan(
@@ -879,59 +1000,45 @@ async def qr_code_scan(
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    # Find student by QR code
-    result = await db.execute(select(Student).where(Student.qr_code == qr_data.qrCode))
-    student = result.scalar_one_or_none()
-    
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found with this QR code")
-    
-    # Check if class exists
-    result = await db.execute(select(Class).where(Class.id == qr_data.classId))
-    class_info = result.scalar_one_or_none()
-    
-    if not class_info:
-        raise HTTPException(status_code=404, detail="Class not found")
-    
-    # Check if student is already checked in for this class today
-    today = datetime.now().date()
-    result = await db.execute(
-        select(Attendance).where(
-            Attendance.student_id == student.id,
-            Attendance.class_id == qr_data.classId,
-            Attendance.check_in_time >= today
-        )
-    )
-    existing_attendance = result.scalar_one_or_none()
-    
-    if existing_attendance:
-        raise HTTPException(status_code=400, detail="Student already checked in for this class today")
-    
-    # Create attendance record
-    attendance = Attendance(
-        student_id=student.id,
-        class_id=qr_data.classId,
-        dojo_id=student.dojo_id,
-        check_in_time=datetime.now(),
-        check_in_method="qr_code",
-        checked_in_by=current_user.id
+    # Validate student, class and duplicate-today and insert in one statement
+    attendance = await check_in(
+        db,
+        Student.qr_code == qr_data.qr_code,
+        qr_data.class_id,
+        method="qr_code",
+        checked_in_by=current_user.id,
+        student_not_found="Student not found with this QR code"
     )
+    await db.commit()
+    await job_queue.enqueue("record_daily_counts", record_daily_counts, [attendance], 1)
     
-    db.add(attendance)
+    return attendance_to_model(attendance)
+
+@router.post("/attendance/qr-scan/batch", response_model=List[QRCodeScanResult])
+async def qr_code_scan_batch(
+    scans: List[QRCodeScanRequest],
+    current_user: User = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Replay queued kiosk scans; each scan gets its own result instead of failing the batch"""
+    if len(scans) > MAX_BATCH_SCANS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SCANS} scans per batch")
+    
+    results = await check_in_batch(db, scans, checked_in_by=current_user.id)
     await db.commit()
-    await db.refresh(attendance)
+    created = [attendance for _, attendance in results if attendance is not None]
+    if created:
+        await job_queue.enqueue("record_daily_counts", record_daily_counts, created, 1)
     
-    return AttendanceModel(
-        id=attendance.id,
-        studentId=attendance.student_id,
-        classId=attendance.class_id,
-        dojoId=attendance.dojo_id,
-        checkInTime=attendance.check_in_time,
-        checkInMethod=CheckInMethod(attendance.check_in_method),
-        notes=attendance.notes,
-        checkedInBy=attendance.checked_in_by,
-        createdAt=attendance.created_at
-    )
+    return [
+        QRCodeScanResult(
+            qrCode=scan.qr_code,
+            classId=scan.class_id,
+            status=scan_status,
+            attendance=attendance_to_model(attendance) if attendance else None
+        )
+        for scan, (scan_status, attendance) in zip(scans, results)
+    ]
 
 @router.post("/attendance/manual", response_model=AttendanceModel)
 async def manual_checkin(
@@ -939,59 +1046,43 @@ async def manual_checkin(
     current_user: User = Depends(require_role([UserRole.INSTRUCTOR])),
     db: AsyncSession = Depends(get_db)
 ):
-    # Check if student exists
-    result = await db.execute(select(Student).where(Student.id == attendance_data.studentId))
-    student = result.scalar_one_or_none()
-    
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Check if class exists
-    result = await db.execute(select(Class).where(Class.id == attendance_data.classId))
-    cls = result.scalar_one_or_none()
-    
-    if not cls:
-        raise HTTPException(status_code=404, detail="Class not found")
+    # Validate student, class and duplicate-today and insert in one statement
+    attendance = await check_in(
+        db,
+        Student.id == attendance_data.student_id,
+        attendance_data.class_id,
+        method="manual",
+        checked_in_by=current_user.id,
+        dojo_id=attendance_data.dojo_id,
+        notes=attendance_data.notes
+    )
+    await db.commit()
+    await job_queue.enqueue("record_daily_counts", record_daily_counts, [attendance], 1)
     
-    # Check for duplicate attendance on the same day
-    today = datetime.now().date()
+    return attendance_to_model(attendance)
+
+@router.delete("/attendance/{attendance_id}")
+async def delete_attendance(
+    attendance_id: int,
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR])),
+    db: AsyncSession = Depends(get_db)
+):
     result = await db.execute(
-        select(Attendance).where(
-            Attendance.student_id == attendance_data.studentId,
-            Attendance.class_id == attendance_data.classId,
-            Attendance.check_in_time >= today
+        delete(Attendance).where(Attendance.id == attendance_id)
+        .returning(
+            Attendance.student_id, Attendance.class_id, Attendance.dojo_id,
+            Attendance.check_in_time, Attendance.check_in_method
         )
     )
-    existing_attendance = result.scalar_one_or_none()
-    
-    if existing_attendance:
-        raise HTTPException(status_code=400, detail="Student already checked in for this class today")
-    
-    # Create attendance record
-    attendance = Attendance(
-        student_id=attendance_data.studentId,
-        class_id=attendance_data.classId,
-        dojo_id=attendance_data.dojoId,
-        check_in_method="manual",
-        notes=attendance_data.notes,
-        checked_in_by=current_user.id
-    )
+    deleted = result.one_or_none()
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Attendance record not found")
     
-    db.add(attendance)
+    await track_attendance(db, [deleted], -1)
     await db.commit()
-    await db.refresh(attendance)
+    await job_queue.enqueue("record_daily_counts", record_daily_counts, [deleted], -1)
     
-    return AttendanceModel(
-        id=attendance.id,
-        studentId=attendance.student_id,
-        classId=attendance.class_id,
-        dojoId=attendance.dojo_id,
-        checkInTime=attendance.check_in_time,
-        checkInMethod=CheckInMethod(attendance.check_in_method),
-        notes=attendance.notes,
-        checkedInBy=attendance.checked_in_by,
-        createdAt=attendance.created_at
-    )
+    return {"message": "Attendance record deleted successfully"}
 
 @router.delete("/bookings/{class_id}/{student_id}")
 async def delete_booking_by_class_and_student(
@@ -1000,12 +1091,12 @@ async def delete_booking_by_class_and_student(
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    # Find the booking
+    # Find the booking, preferring the active one over cancelled history
     result = await db.execute(
         select(Booking).where(
             Booking.class_id == class_id,
             Booking.student_id == student_id
-        )
+        ).order_by(Booking.is_active.desc(), Booking.id.desc()).limit(1)
     )
     booking = result.scalar_one_or_none()
     
@@ -1025,9 +1116,14 @@ async def delete_booking_by_class_and_student(
         if not student:
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Delete the booking
-    await db.execute(delete(Booking).where(Booking.id == booking.id))
+    # Delete the booking, freeing its seat if it was still active
+    result = await db.execute(
+        delete(Booking).where(Booking.id == booking.id).returning(Booking.is_active)
+    )
+    if result.scalar_one_or_none():
+        await hand_over_seat(db, class_id)
     await db.commit()
+    await publish_version_bumps(db)
     
     return {"message": "Booking deleted successfully"}
 
@@ -1052,99 +1148,46 @@ async def get_student_bookings(
     
     # Get bookings with class details for this student
     result = await db.execute(
-        select(Booking, Class).join(Class, Booking.class_id == Class.id)
+        select(
+            Booking.id, Booking.student_id, Booking.class_id, Booking.booked_at,
+            Booking.is_active, Booking.created_at,
+            Class.name.label("class_name"),
+            Class.description.label("class_description"),
+            Class.day_of_week, Class.start_time, Class.end_time, Class.belt_level_required,
+        ).join(Class, Booking.class_id == Class.id)
         .where(
             Booking.student_id == student_id,
             Booking.is_active == True
         ).order_by(Booking.created_at.desc())
     )
-    booking_class_pairs = result.all()
     
-    return [
-        StudentBookingWithClass(
-            id=booking.id,
-            student_id=booking.student_id,
-            class_id=booking.class_id,
-            booked_at=booking.booked_at,
-            is_active=booking.is_active,
-            created_at=booking.created_at,
-            class_name=cls.name,
-            class_description=cls.description,
-            day_of_week=cls.day_of_week,
-            start_time=cls.start_time,
-            end_time=cls.end_time,
-            belt_level_required=cls.belt_level_required
-        )
-        for booking, cls in booking_class_pairs
-    ]
+    return json_list(StudentBookingWithClass, result.all())
 
 # Enrollment routes
 @router.get("/enrollments", response_model=List[EnrollmentWithClassDetails])
 async def get_enrollments(
+    response: Response,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    if current_user.role == "instructor":
-        # Instructors can see all enrollments
-        result = await db.execute(
-            select(Enrollment, Class, User, Dojo)
-            .join(Class, Enrollment.class_id == Class.id)
-            .join(User, Class.instructor_id == User.id)
-            .join(Dojo, Class.dojo_id == Dojo.id)
-            .order_by(Enrollment.created_at.desc())
-        )
-        enrollment_data = result.all()
-    elif current_user.role == "parent":
+    query = enrollment_details_query()
+    if current_user.role == "parent":
         # Parents can see enrollments for their children
-        result = await db.execute(
-            select(Enrollment, Class, User, Dojo)
-            .join(Class, Enrollment.class_id == Class.id)
-            .join(User, Class.instructor_id == User.id)
-            .join(Dojo, Class.dojo_id == Dojo.id)
-            .join(Student, Enrollment.student_id == Student.id)
-            .where(Student.parent_id == current_user.id)
-            .order_by(Enrollment.created_at.desc())
+        query = query.join(Student, Enrollment.student_id == Student.id).where(
+            Student.parent_id == current_user.id
         )
-        enrollment_data = result.all()
-    else:
+    elif current_user.role != "instructor":
         # Students can see their own enrollments
-        result = await db.execute(
-            select(Enrollment, Class, User, Dojo)
-            .join(Class, Enrollment.class_id == Class.id)
-            .join(User, Class.instructor_id == User.id)
-            .join(Dojo, Class.dojo_id == Dojo.id)
-            .join(Student, Enrollment.student_id == Student.id)
-            .where(Student.user_id == current_user.id)
-            .order_by(Enrollment.created_at.desc())
+        query = query.join(Student, Enrollment.student_id == Student.id).where(
+            Student.user_id == current_user.id
         )
-        enrollment_data = result.all()
     
-    return [
-        EnrollmentWithClassDetails(
-            id=enrollment.id,
-            studentId=enrollment.student_id,
-            classId=enrollment.class_id,
-            status=EnrollmentStatus(enrollment.status),
-            enrolledBy=enrollment.enrolled_by,
-            enrollmentDate=enrollment.enrollment_date,
-            startDate=enrollment.start_date,
-            endDate=enrollment.end_date,
-            notes=enrollment.notes,
-            attendanceCount=enrollment.attendance_count,
-            totalSessions=enrollment.total_sessions,
-            createdAt=enrollment.created_at,
-            updatedAt=enrollment.updated_at,
-            className=cls.name,
-            classDescription=cls.description,
-            dayOfWeek=cls.day_of_week,
-            startTime=cls.start_time,
-            endTime=cls.end_time,
-            beltLevelRequired=cls.belt_level_required,
-            instructorName=f"{instructor.first_name} {instructor.last_name}",
-            dojoName=dojo.name
-        )
-        for enrollment, cls, instructor, dojo in enrollment_data
-    ]
+    # Newest first; ids are assigned in creation order
+    result = await db.execute(paginate(query, page, Enrollment.id, descending=True))
+    enrollment_data = finish_page(response, result.all(), page, lambda row: row.id)
+    
+    return json_list(EnrollmentWithClassDetails, enrollment_data, response)
 
 @router.get("/students/{student_id}/enrollments", response_model=List[EnrollmentWithClassDetails])
 async def get_student_enrollments(
@@ -1167,41 +1210,12 @@ async def get_student_enrollments(
     
     # Get enrollments for this student
     result = await db.execute(
-        select(Enrollment, Class, User, Dojo)
-        .join(Class, Enrollment.class_id == Class.id)
-        .join(User, Class.instructor_id == User.id)
-        .join(Dojo, Class.dojo_id == Dojo.id)
+        enrollment_details_query()
         .where(Enrollment.student_id == student_id)
         .order_by(Enrollment.created_at.desc())
     )
-    enrollment_data = result.all()
     
-    return [
-        EnrollmentWithClassDetails(
-            id=enrollment.id,
-            studentId=enrollment.student_id,
-            classId=enrollment.class_id,
-            status=EnrollmentStatus(enrollment.status),
-            enrolledBy=enrollment.enrolled_by,
-            enrollmentDate=enrollment.enrollment_date,
-            startDate=enrollment.start_date,
-            endDate=enrollment.end_date,
-            notes=enrollment.notes,
-            attendanceCount=enrollment.attendance_count,
-            totalSessions=enrollment.total_sessions,
-            createdAt=enrollment.created_at,
-            updatedAt=enrollment.updated_at,
-            className=cls.name,
-            classDescription=cls.description,
-            dayOfWeek=cls.day_of_week,
-            startTime=cls.start_time,
-            endTime=cls.end_time,
-            beltLevelRequired=cls.belt_level_required,
-            instructorName=f"{instructor.first_name} {instructor.last_name}",
-            dojoName=dojo.name
-        )
-        for enrollment, cls, instructor, dojo in enrollment_data
-    ]
+    return json_list(EnrollmentWithClassDetails, result.all())
 
 @router.post("/enrollments", response_model=EnrollmentModel)
 async def create_enrollment(
@@ -1217,33 +1231,22 @@ async def create_enrollment(
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Check if class exists
-    result = await db.execute(select(Class).where(Class.id == enrollment_data.class_id))
-    class_obj = result.scalar_one_or_none()
+    class_obj = await catalog.get_class(db, enrollment_data.class_id)
     if not class_obj:
         raise HTTPException(status_code=404, detail="Class not found")
     
     # Check if enrollment already exists
-    result = await db.execute(
-        select(Enrollment).where(
-            Enrollment.student_id == enrollment_data.student_id,
-            Enrollment.class_id == enrollment_data.class_id,
-            Enrollment.status.in_(["enrolled", "waitlisted"])
-        )
-    )
-    existing_enrollment = result.scalar_one_or_none()
-    if existing_enrollment:
+    if await exists_where(
+        db, Enrollment,
+        Enrollment.student_id == enrollment_data.student_id,
+        Enrollment.class_id == enrollment_data.class_id,
+        Enrollment.status.in_(["enrolled", "waitlisted"])
+    ):
         raise HTTPException(status_code=400, detail="Student is already enrolled in this class")
     
-    # Check class capacity and set status
+    # Take a seat, or waitlist the student if the class is full
     if enrollment_data.status == EnrollmentStatus.ENROLLED:
-        result = await db.execute(
-            select(Enrollment).where(
-                Enrollment.class_id == enrollment_data.class_id,
-                Enrollment.status == EnrollmentStatus.ENROLLED
-            )
-        )
-        enrolled_count = len(result.scalars().all())
-        if enrolled_count >= class_obj.max_capacity:
+        if not await reserve_seat(db, class_obj.id):
             enrollment_data.status = EnrollmentStatus.WAITLISTED
     
     # Create enrollment
@@ -1261,15 +1264,8 @@ async def create_enrollment(
     )
     
     db.add(enrollment)
-    
-    # Update class enrollment count if status is enrolled
-    if enrollment_data.status == EnrollmentStatus.ENROLLED:
-        await db.execute(
-            update(Class).where(Class.id == class_obj.id)
-            .values(current_enrollment=class_obj.current_enrollment + 1)
-        )
-    
     await db.commit()
+    await publish_version_bumps(db)
     await db.refresh(enrollment)
     
     return enrollment
@@ -1313,29 +1309,28 @@ async def update_enrollment(
     if enrollment_data.total_sessions is not None:
         update_data["total_sessions"] = enrollment_data.total_sessions
     
-    await db.execute(
-        update(Enrollment).where(Enrollment.id == enrollment_id).values(**update_data)
+    if old_status != "enrolled" and new_status == "enrolled":
+        # Student was not enrolled, now enrolled - take a seat first
+        if not await reserve_seat(db, enrollment.class_id):
+            raise HTTPException(status_code=400, detail="Class is at maximum capacity")
+    
+    # Only apply the change if the status is still the one we read, so two
+    # concurrent status changes cannot both adjust the class count
+    result = await db.execute(
+        update(Enrollment)
+        .where(Enrollment.id == enrollment_id, Enrollment.status == old_status)
+        .values(**update_data)
     )
+    if result.rowcount == 0:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Enrollment was modified concurrently, please retry")
     
-    # Update class enrollment count if status changed
-    if old_status != new_status:
-        result = await db.execute(select(Class).where(Class.id == enrollment.class_id))
-        cls = result.scalar_one()
-        
-        if old_status == "enrolled" and new_status != "enrolled":
-            # Student was enrolled, now not enrolled - decrease count
-            await db.execute(
-                update(Class).where(Class.id == cls.id)
-                .values(current_enrollment=max(0, cls.current_enrollment - 1))
-            )
-        elif old_status != "enrolled" and new_status == "enrolled":
-            # Student was not enrolled, now enrolled - increase count
-            await db.execute(
-                update(Class).where(Class.id == cls.id)
-                .values(current_enrollment=cls.current_enrollment + 1)
-            )
+    if old_status == "enrolled" and new_status != "enrolled":
+        # Student was enrolled, now not enrolled - the seat goes to the waitlist
+        await hand_over_seat(db, enrollment.class_id, exclude_id=enrollment_id)
     
     await db.commit()
+    await publish_version_bumps(db)
     
     # Get updated enrollment
     result = await db.execute(select(Enrollment).where(Enrollment.id == enrollment_id))
@@ -1376,18 +1371,36 @@ async def delete_enrollment(
     if (current_user.role == "parent" and student.parent_id != current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Update class enrollment count if status was enrolled
-    if enrollment.status == "enrolled":
-        result = await db.execute(select(Class).where(Class.id == enrollment.class_id))
-        cls = result.scalar_one()
-        
-        await db.execute(
-            update(Class).where(Class.id == cls.id)
-            .values(current_enrollment=max(0, cls.current_enrollment - 1))
-        )
-    
-    # Delete enrollment
-    await db.execute(delete(Enrollment).where(Enrollment.id == enrollment_id))
+    # Delete enrollment, handing its seat on if the deleted row was enrolled
+    result = await db.execute(
+        delete(Enrollment).where(Enrollment.id == enrollment_id).returning(Enrollment.status)
+    )
+    if result.scalar_one_or_none() == "enrolled":
+        await hand_over_seat(db, enrollment.class_id)
     await db.commit()
+    await publish_version_bumps(db)
     
-    return {"message": "Enrollment deleted successfully"} 
\ No newline at end of file
+    return {"message": "Enrollment deleted successfully"}
+
+# Export routes
+@router.get("/export/attendance")
+async def export_attendance(
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    """Stream every attendance record as newline-delimited JSON"""
+    query = select(*columns_for(Attendance, AttendanceModel)).order_by(Attendance.id)
+    return StreamingResponse(
+        stream_ndjson(query, AttendanceModel),
+        media_type="application/x-ndjson"
+    )
+
+@router.get("/export/enrollments")
+async def export_enrollments(
+    current_user: User = Depends(require_role([UserRole.INSTRUCTOR]))
+):
+    """Stream every enrollment with class details as newline-delimited JSON"""
+    query = enrollment_details_query().order_by(Enrollment.id)
+    return StreamingResponse(
+        stream_ndjson(query, EnrollmentWithClassDetails),
+        media_type="application/x-ndjson"
+    )
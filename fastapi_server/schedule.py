@@ -0,0 +1,164 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from models import DayOfWeek
+from versions import current_versions
+import catalog
+
+# Weekly timetable per dojo for the schedule endpoints. Each dojo's active
+# classes are kept as slots sorted by minute of the week (Monday 00:00 = 0),
+# so "what is on now" and "what is next" are bisections instead of parsing
+# every class's strings on each request.
+#
+# An index is built from catalog.classes_for_dojo on first use. The class
+# write routes apply their change to it after committing (class_saved /
+# class_deleted) and count the table_versions bump they made. A reader that
+# finds the "classes" version moved by more than this worker's own writes
+# (another worker changed a class) drops every index and rebuilds on demand.
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+WEEKDAYS = [day.value for day in DayOfWeek]  # Monday first, like datetime.weekday()
+
+def minute_of_day(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+class Slot(NamedTuple):
+    start: int  # minutes since Monday 00:00
+    end: int  # may run past the end of the week for Sunday-night classes
+    class_id: int
+    entry: dict  # ScheduleEntry fields
+
+def slot_for(row) -> Slot:
+    start = WEEKDAYS.index(row.day_of_week) * MINUTES_PER_DAY + minute_of_day(row.start_time)
+    end = WEEKDAYS.index(row.day_of_week) * MINUTES_PER_DAY + minute_of_day(row.end_time)
+    if end <= start:
+        # Ends after midnight
+        end += MINUTES_PER_DAY
+    entry = {
+        "class_id": row.id,
+        "name": row.name,
+        "instructor_id": row.instructor_id,
+        "day_of_week": row.day_of_week,
+        "start_time": row.start_time,
+        "end_time": row.end_time,
+        "belt_level_required": row.belt_level_required,
+    }
+    return Slot(start, end, row.id, entry)
+
+class DojoSchedule:
+    """One dojo's active classes in weekly order"""
+
+    def __init__(self, rows=()):
+        self.slots: list[Slot] = sorted(slot_for(row) for row in rows if row.is_active)
+        self.starts = [slot.start for slot in self.slots]
+        self._by_class = {slot.class_id: slot for slot in self.slots}
+        # Upper bound on class length, which limits how far back running() looks
+        self.longest = max((slot.end - slot.start for slot in self.slots), default=0)
+
+    def add(self, row) -> None:
+        self.discard(row.id)
+        if row.is_active:
+            slot = slot_for(row)
+            index = bisect_left(self.slots, slot)
+            self.slots.insert(index, slot)
+            self.starts.insert(index, slot.start)
+            self._by_class[slot.class_id] = slot
+            self.longest = max(self.longest, slot.end - slot.start)
+
+    def discard(self, class_id: int) -> None:
+        slot = self._by_class.pop(class_id, None)
+        if slot is not None:
+            index = bisect_left(self.slots, slot)
+            del self.slots[index]
+            del self.starts[index]
+
+    def running(self, minute: int) -> list[tuple[Slot, int]]:
+        """(slot, week offset) pairs in progress at minute of the week.
+
+        Sunday-night classes still running early on Monday started in the
+        previous week, so they come back with offset -1.
+        """
+        found = []
+        for week_offset, at in ((-1, minute + MINUTES_PER_WEEK), (0, minute)):
+            low = bisect_left(self.starts, at - self.longest)
+            found += [
+                (slot, week_offset)
+                for slot in self.slots[low:bisect_right(self.starts, at)] if slot.end > at
+            ]
+        return found
+
+    def next_after(self, minute: int) -> Optional[tuple[Slot, int]]:
+        """(slot, week offset) of the next slot to start after minute of the week"""
+        if not self.slots:
+            return None
+        index = bisect_right(self.starts, minute)
+        if index < len(self.slots):
+            return self.slots[index], 0
+        return self.slots[0], 1
+
+_schedules: dict[int, DojoSchedule] = {}
+_built_version: Optional[int] = None
+
+async def dojo_schedule(db: AsyncSession, dojo_id: int) -> DojoSchedule:
+    global _built_version
+    version = (await current_versions(db)).get("classes", 0)
+    if version != _built_version:
+        _schedules.clear()
+        _built_version = version
+    schedule = _schedules.get(dojo_id)
+    if schedule is None:
+        schedule = _schedules[dojo_id] = DojoSchedule(await catalog.classes_for_dojo(db, dojo_id))
+    return schedule
+
+def _count_own_write() -> None:
+    global _built_version
+    if _built_version is not None:
+        _built_version += 1
+
+def class_saved(row, previous_dojo_id: Optional[int] = None) -> None:
+    """Apply a committed class insert or update"""
+    _count_own_write()
+    if previous_dojo_id is not None and previous_dojo_id in _schedules:
+        _schedules[previous_dojo_id].discard(row.id)
+    if row.dojo_id in _schedules:
+        _schedules[row.dojo_id].add(row)
+
+def class_deleted(class_id: int, dojo_id: int) -> None:
+    """Apply a committed class delete"""
+    _count_own_write()
+    if dojo_id in _schedules:
+        _schedules[dojo_id].discard(class_id)
+
+def minute_of_week(at: datetime) -> int:
+    return at.weekday() * MINUTES_PER_DAY + at.hour * 60 + at.minute
+
+def week_start(at: datetime) -> datetime:
+    return (at - timedelta(days=at.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def slot_times(slot: Slot, at: datetime, week_offset: int = 0) -> dict:
+    """Concrete start and end datetimes for slot in the week containing at"""
+    base = week_start(at) + timedelta(weeks=week_offset)
+    return {
+        **slot.entry,
+        "starts_at": base + timedelta(minutes=slot.start),
+        "ends_at": base + timedelta(minutes=slot.end),
+    }
+
+async def schedule_now(db: AsyncSession, dojo_id: int, at: datetime) -> dict:
+    """Classes running at `at` and the next one to start"""
+    schedule = await dojo_schedule(db, dojo_id)
+    minute = minute_of_week(at)
+    upcoming = schedule.next_after(minute)
+    next_class = None
+    if upcoming is not None:
+        slot, week_offset = upcoming
+        next_class = slot_times(slot, at, week_offset)
+    return {
+        "at": at,
+        "current": [slot_times(slot, at, week_offset) for slot, week_offset in schedule.running(minute)],
+        "next": next_class,
+    }
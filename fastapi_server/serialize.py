@@ -0,0 +1,51 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.engine import Row
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+# List endpoints select just the columns a response model needs, validate the
+# rows into the model once and encode them with pydantic-core, then return the
+# bytes in a Response. FastAPI passes Response objects through untouched, so
+# rows are not built by hand and validated again against response_model.
+# Keep response_model on the route for the OpenAPI schema.
+#
+# Rows are turned into dicts keyed by field name before validation. Validating
+# ORM objects or Rows with from_attributes tries each camelCase alias first and
+# pays for an AttributeError per field, which costs more than the query.
+
+class JSONBytesResponse(Response):
+    """Response whose body is already-encoded JSON"""
+    media_type = "application/json"
+
+@lru_cache(maxsize=None)
+def list_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def columns_for(entity, model: type) -> list:
+    """Columns of entity named like model's fields, for column-only selects"""
+    return [getattr(entity, name) for name in model.model_fields]
+
+def as_dicts(rows: Iterable) -> list:
+    rows = list(rows)
+    if rows and isinstance(rows[0], Row):
+        keys = rows[0]._fields
+        return [dict(zip(keys, row)) for row in rows]
+    return rows
+
+def dump_list(model: type, rows: Iterable) -> bytes:
+    """Validate rows (Rows, dicts or ORM objects) as a list of model and encode it"""
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(as_dicts(rows), from_attributes=True), by_alias=True)
+
+def dump_lines(model: type, rows: Iterable) -> bytes:
+    """Encode rows as newline-delimited JSON, one model per line"""
+    items = list_adapter(model).validate_python(as_dicts(rows), from_attributes=True)
+    return b"".join(item.model_dump_json(by_alias=True).encode() + b"\n" for item in items)
+
+def json_list(model: type, rows: Iterable, response: Optional[Response] = None) -> JSONBytesResponse:
+    """Serialize rows as a JSON array, keeping headers set on the injected response"""
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return JSONBytesResponse(dump_list(model, rows), headers=headers)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the FastAPI server
+
+Runs several uvicorn worker processes (one event loop per core by default)
+and uses uvloop/httptools when they are installed. On SIGTERM each worker
+stops accepting connections and finishes in-flight requests, for at most
+GRACEFUL_SHUTDOWN_TIMEOUT seconds, before exiting.
+
+    python serve.py                   # production: WEB_CONCURRENCY workers
+    python serve.py --reload          # development: one worker, auto-reload
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+from typing import Optional
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the FastAPI server")
+    parser.add_argument("--host", default=os.getenv("FASTAPI_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=env_int("FASTAPI_PORT", env_int("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=env_int("WEB_CONCURRENCY", os.cpu_count() or 1),
+                        help="worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--reload", action="store_true",
+                        help="development mode: single worker that restarts on code changes")
+    return parser.parse_args(argv)
+
+def build_config(args: argparse.Namespace) -> dict:
+    """Keyword arguments for uvicorn.run"""
+    config = {
+        "host": args.host,
+        "port": args.port,
+        "loop": "uvloop" if available("uvloop") else "asyncio",
+        "http": "httptools" if available("httptools") else "h11",
+        "backlog": env_int("BACKLOG", 2048),
+        "limit_concurrency": env_int("LIMIT_CONCURRENCY"),
+        "limit_max_requests": env_int("LIMIT_MAX_REQUESTS"),
+        "timeout_keep_alive": env_int("KEEP_ALIVE_TIMEOUT", 5),
+        "timeout_graceful_shutdown": env_int("GRACEFUL_SHUTDOWN_TIMEOUT", 30),
+        "log_level": os.getenv("LOG_LEVEL", "info"),
+    }
+    if args.reload:
+        config["reload"] = True
+    else:
+        config["workers"] = max(1, args.workers)
+    return config
+
+async def prepare_database():
+    """Create the schema once before workers start, so they do not race on it"""
+    from database import engine, init_db
+    await init_db()
+    await engine.dispose()
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = build_config(args)
+    if config.get("workers", 1) > 1:
+        asyncio.run(prepare_database())
+
+    mode = "development (reload)" if args.reload else f"{config['workers']} worker(s)"
+    print(f"Starting FastAPI server on {args.host}:{args.port}: {mode}, "
+          f"loop={config['loop']}, http={config['http']}")
+    print(f"  - Swagger UI: http://{args.host}:{args.port}/docs")
+    print(f"  - Health check: http://{args.host}:{args.port}/api/health")
+    uvicorn.run("main:app", **config)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,10 @@
 #!/usr/bin/env python3
 """
 Startup script for the FastAPI server
-"""
-import uvicorn
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+Starts the production launcher; pass --reload for development.
+"""
+from serve import main
 
 if __name__ == "__main__":
-    port = int(os.getenv("FASTAPI_PORT", 8000))
-    host = os.getenv("FASTAPI_HOST", "0.0.0.0")
-    
-    print(f"Starting FastAPI server on {host}:{port}")
-    print("API Documentation available at:")
-    print(f"  - Swagger UI: http://{host}:{port}/docs")
-    print(f"  - ReDoc: http://{host}:{port}/redoc")
-    print(f"  - Health check: http://{host}:{port}/api/health")
-    
-    uvicorn.run(
-        "main:app",
-        host=host,
-        port=port,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    main()
@@ -0,0 +1,129 @@
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
+from collections import Counter
+from typing import AsyncIterable, AsyncIterator, Iterable
+import codecs
+import csv
+import os
+from dotenv import load_dotenv
+
+from database import Student
+from models import StudentCreate, Student as StudentModel
+from qrcodes import allocate_qr_codes
+from serialize import columns_for
+import catalog
+
+load_dotenv()
+
+# Bulk student import for onboarding a dojo. Rows are validated as they
+# arrive, but nothing touches the database until the whole body has been
+# read: a slow upload must not hold the writer connection (or, on
+# PostgreSQL, the qr_sequences row locks). The students are then inserted
+# IMPORT_CHUNK_SIZE at a time, each chunk taking its QR codes from the dojo
+# sequences in one UPDATE per dojo. Everything happens in the caller's
+# transaction: if any row is invalid nothing is committed and the errors
+# come back together.
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", 10000))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+# Errors reported back for a rejected import
+MAX_IMPORT_ERRORS = 100
+
+async def csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    """Parse an uploaded CSV as it streams in, one student per line.
+
+    The header names fields by name or alias (dojo_id or dojoId). Empty cells
+    are left out so the model defaults apply.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header = None
+    pending = ""
+
+    def parse(lines):
+        nonlocal header
+        for values in csv.reader(lines):
+            if not values:
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield {name: value for name, value in zip(header, values) if value != ""}
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for row in parse(lines):
+            yield row
+    pending += decoder.decode(b"", final=True)
+    for row in parse([pending]):
+        yield row
+
+async def json_rows(rows: Iterable) -> AsyncIterator:
+    for row in rows:
+        yield row
+
+def describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+async def _insert_chunk(db: AsyncSession, students: list[StudentCreate]) -> list:
+    codes = {
+        dojo_id: iter(await allocate_qr_codes(db, dojo_id, count))
+        for dojo_id, count in Counter(student.dojo_id for student in students).items()
+    }
+    result = await db.execute(
+        insert(Student).returning(*columns_for(Student, StudentModel), sort_by_parameter_order=True),
+        [
+            {
+                "user_id": student.user_id,
+                "parent_id": student.parent_id,
+                "dojo_id": student.dojo_id,
+                "belt_level": student.belt_level,
+                "age": student.age,
+                "qr_code": next(codes[student.dojo_id]),
+                "is_active": True,
+            }
+            for student in students
+        ]
+    )
+    return result.all()
+
+async def import_students(db: AsyncSession, rows: AsyncIterable) -> list:
+    """Validate and insert rows as students, returning the created rows.
+
+    Raises a 422 listing the bad rows (numbered from 1) if any row is invalid
+    and a 413 past MAX_IMPORT_ROWS; the caller must not commit in that case.
+    """
+    students = []
+    errors = []
+    number = 0
+    async for row in rows:
+        number += 1
+        if number > MAX_IMPORT_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_IMPORT_ROWS} students per import")
+        try:
+            students.append((number, StudentCreate.model_validate(row)))
+        except ValidationError as error:
+            errors.append({"row": number, "error": describe(error)})
+
+    # The body has been read; only now touch the database
+    unknown_dojos = {
+        dojo_id for dojo_id in {student.dojo_id for _, student in students}
+        if await catalog.get_dojo(db, dojo_id) is None
+    }
+    if unknown_dojos:
+        errors += [
+            {"row": number, "error": "Dojo not found"}
+            for number, student in students if student.dojo_id in unknown_dojos
+        ]
+        errors.sort(key=lambda error: error["row"])
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[:MAX_IMPORT_ERRORS])
+
+    created = []
+    students = [student for _, student in students]
+    for start in range(0, len(students), IMPORT_CHUNK_SIZE):
+        created += await _insert_chunk(db, students[start:start + IMPORT_CHUNK_SIZE])
+    return created
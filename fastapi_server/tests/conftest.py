@@ -0,0 +1,22 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+import pytest
+from contextlib import contextmanager
+from querycount import count_queries
+
+@pytest.fixture
+def assert_max_queries():
+    """Fail the test if the block runs more than n SQL statements.
+
+        def test_something(assert_max_queries):
+            with assert_max_queries(2):
+                client.get(...)
+    """
+    @contextmanager
+    def check(n: int):
+        with count_queries() as log:
+            yield log
+        assert len(log) <= n, f"expected at most {n} SQL statements, ran {len(log)}:\n{log}"
+    return check
@@ -6,14 +6,17 @@ import pytest
 from fastapi.testclient import TestClient
 from main import app
 from database import init_db
+from pagination import encode_cursor
 import asyncio
+import time
+from datetime import datetime, timedelta
 
 client = TestClient(app)
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
     """Initialize database before running tests"""
-    asyncio.run(init_db())
+    asyncio.run(init_db(seed=True))
 
 @pytest.fixture
 def clean_enrollments():
@@ -38,6 +41,14 @@ def clean_enrollments():
     # Optionally clean up after test too
     # (keeping this empty for now as we want to see test results)
 
+def test_startup_skips_migration_on_current_schema():
+    """Test app startup on a migrated database is quick and records its cold-start time"""
+    with TestClient(app) as started:
+        assert started.get("/api/health").status_code == 200
+    assert app.state.init_db_seconds < 1.0
+    assert 0 < app.state.startup_seconds
+    assert "process_startup_seconds " in client.get("/metrics").text
+
 def test_health():
     """Test health check endpoint"""
     response = client.get("/api/health")
@@ -101,6 +112,64 @@ def test_student_creation():
     assert student["beltLevel"] == "white"
     assert student["age"] == 10
 
+def test_create_students_get_distinct_qr_codes():
+    """Test students created back to back get distinct QR codes embedding their dojo"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['accessToken']}"}
+    
+    qr_codes = [
+        client.post("/api/students", json={"dojoId": 1}, headers=headers).json()["qrCode"]
+        for _ in range(3)
+    ]
+    assert len(set(qr_codes)) == 3
+    assert all(qr_code.startswith("DOJO:1:STUDENT:") for qr_code in qr_codes)
+    
+    response = client.post("/api/students", json={"dojoId": 999}, headers=headers)
+    assert response.status_code == 404
+
+def test_bulk_import_students():
+    """Test bulk import from JSON and CSV, and that one bad row rejects the whole import"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['accessToken']}"}
+    
+    response = client.post("/api/students/bulk", json=[
+        {"dojoId": 1, "beltLevel": "yellow", "age": 9},
+        {"dojoId": 1},
+    ], headers=headers)
+    assert response.status_code == 200
+    created = response.json()
+    assert [s["beltLevel"] for s in created] == ["yellow", "white"]
+    
+    csv_body = "dojo_id,beltLevel,age\n1,green,12\n1,,\n1,blue,15\n"
+    response = client.post(
+        "/api/students/bulk", content=csv_body.encode(),
+        headers={**headers, "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    created += response.json()
+    assert [s["beltLevel"] for s in created[2:]] == ["green", "white", "blue"]
+    assert len({s["qrCode"] for s in created}) == 5
+    
+    student_count = len(client.get("/api/students", params={"limit": 1000}, headers=headers).json())
+    response = client.post("/api/students/bulk", json=[
+        {"dojoId": 1},
+        {"dojoId": 1, "age": "old"},
+        {"dojoId": 999},
+    ], headers=headers)
+    assert response.status_code == 422
+    assert [error["row"] for error in response.json()["detail"]] == [2, 3]
+    assert len(client.get("/api/students", params={"limit": 1000}, headers=headers).json()) == student_count
+    
+    parent_login = client.post("/api/auth/login", json={"username": "parent", "password": "parent12377"})
+    parent_headers = {"Authorization": f"Bearer {parent_login.json()['accessToken']}"}
+    assert client.post("/api/students/bulk", json=[{"dojoId": 1}], headers=parent_headers).status_code == 403
+
 def test_student_profile():
     """Test accessing individual student profile"""
     # Login first
@@ -481,6 +550,66 @@ def test_enrollment_waitlist(clean_enrollments):
     response2 = client.post("/api/enrollments", json=enrollment2_data, headers={"Authorization": f"Bearer {token}"})
     assert response2.status_code == 200
     assert response2.json()["status"] == "waitlisted"
+    
+    # Dropping the enrolled student hands the seat to the waitlisted one
+    response = client.put(f"/api/enrollments/{response1.json()['id']}", json={"status": "dropped"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    enrollments = client.get("/api/students/2/enrollments", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [e["status"] for e in enrollments if e["classId"] == class_id] == ["enrolled"]
+    assert client.get(f"/api/classes/{class_id}", headers={"Authorization": f"Bearer {token}"}).json()["currentEnrollment"] == 1
+    
+    # With nobody waiting, the seat goes back to the class
+    response = client.delete(f"/api/enrollments/{response2.json()['id']}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert client.get(f"/api/classes/{class_id}", headers={"Authorization": f"Bearer {token}"}).json()["currentEnrollment"] == 0
+
+def test_promoted_student_class_list_etag(clean_enrollments):
+    """Test a student promoted off the waitlist gets a fresh class list despite their old ETag"""
+    headers = {"Authorization": "Bearer " + client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    }).json()["accessToken"]}
+    
+    username = f"waitlisted_{int(time.time() * 1000)}"
+    user_id = client.post("/api/users", json={
+        "username": username,
+        "password": "secret123",
+        "role": "student",
+        "firstName": "Wait",
+        "lastName": "Listed"
+    }, headers=headers).json()["id"]
+    student_id = client.post("/api/students", json={"dojoId": 1, "userId": user_id}, headers=headers).json()["id"]
+    class_id = client.post("/api/classes", json={
+        "name": "Promotion Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "wednesday",
+        "startTime": "18:00",
+        "endTime": "19:00",
+        "maxCapacity": 1
+    }, headers=headers).json()["id"]
+    
+    seat_holder = client.post("/api/enrollments", json={
+        "studentId": 1, "classId": class_id, "enrolledBy": 1,
+        "enrollmentDate": "2024-01-01T00:00:00Z"
+    }, headers=headers).json()
+    waiting = client.post("/api/enrollments", json={
+        "studentId": student_id, "classId": class_id, "enrolledBy": 1,
+        "enrollmentDate": "2024-01-01T00:00:00Z"
+    }, headers=headers).json()
+    assert (seat_holder["status"], waiting["status"]) == ("enrolled", "waitlisted")
+    
+    student_headers = {"Authorization": "Bearer " + client.post("/api/auth/login", json={
+        "username": username, "password": "secret123"
+    }).json()["accessToken"]}
+    response = client.get("/api/classes", headers=student_headers)
+    assert class_id not in [cls["id"] for cls in response.json()]
+    etag = response.headers["etag"]
+    
+    assert client.delete(f"/api/enrollments/{seat_holder['id']}", headers=headers).status_code == 200
+    response = client.get("/api/classes", headers={**student_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert class_id in [cls["id"] for cls in response.json()]
 
 def test_enrollment_status_transitions(clean_enrollments):
     """Test enrollment status transitions"""
@@ -569,4 +698,677 @@ def test_enrollment_notes(clean_enrollments):
     update_data = {"notes": "Updated enrollment note"}
     response = client.put(f"/api/enrollments/{enrollment_id}", json=update_data, headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200
-    assert response.json()["notes"] == "Updated enrollment note" 
\ No newline at end of file
+    assert response.json()["notes"] == "Updated enrollment note" 
+
+def test_login_rejected_when_hash_queue_full(monkeypatch):
+    """Test login returns 503 instead of queueing once the hashing pool is saturated"""
+    import auth
+    if auth.HASH_WORKERS == 0:
+        pytest.skip("password hashing runs inline")
+    monkeypatch.setattr(auth, "_hash_inflight", auth.HASH_WORKERS + auth.HASH_QUEUE_LIMIT)
+    response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+def test_auth_cache_hits_and_invalidation(monkeypatch):
+    """Test repeated requests are served from the auth cache and role changes invalidate it"""
+    import auth
+    monkeypatch.setattr(auth, "AUTH_STATELESS", False)
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    before = client.get("/api/admin/auth-cache", headers=headers).json()
+    client.get("/api/auth/me", headers=headers)
+    client.get("/api/auth/me", headers=headers)
+    after = client.get("/api/admin/auth-cache", headers=headers).json()
+    assert after["hits"] >= before["hits"] + 3
+    
+    # Create a user, cache them, then change their role
+    username = f"cache_user_{int(time.time() * 1000)}"
+    create_response = client.post("/api/users", json={
+        "username": username,
+        "password": "secret123",
+        "role": "student",
+        "firstName": "Cache",
+        "lastName": "User"
+    }, headers=headers)
+    assert create_response.status_code == 200
+    user_id = create_response.json()["id"]
+    
+    user_token = client.post("/api/auth/login", json={
+        "username": username,
+        "password": "secret123"
+    }).json()["accessToken"]
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/api/auth/me", headers=user_headers).json()["role"] == "student"
+    
+    response = client.put(f"/api/users/{user_id}", json={"role": "parent"}, headers=headers)
+    assert response.status_code == 200
+    # The role change revokes the old token on the database path too
+    assert client.get("/api/auth/me", headers=user_headers).status_code == 401
+    new_token = client.post("/api/auth/login", json={
+        "username": username,
+        "password": "secret123"
+    }).json()["accessToken"]
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {new_token}"}).json()["role"] == "parent"
+
+def test_revoked_token_rejected_despite_stale_cache(monkeypatch):
+    """Test a worker still caching a demoted user rejects their old token once it re-reads token versions"""
+    import auth
+    from jose import jwt
+    monkeypatch.setattr(auth, "AUTH_STATELESS", False)
+    headers = {"Authorization": "Bearer " + client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    }).json()["accessToken"]}
+    
+    username = f"stale_user_{int(time.time() * 1000)}"
+    user_id = client.post("/api/users", json={
+        "username": username,
+        "password": "secret123",
+        "role": "instructor",
+        "firstName": "Stale",
+        "lastName": "User"
+    }, headers=headers).json()["id"]
+    user_token = client.post("/api/auth/login", json={
+        "username": username,
+        "password": "secret123"
+    }).json()["accessToken"]
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/api/auth/me", headers=user_headers).json()["role"] == "instructor"
+    cache_key = (user_id, jwt.get_unverified_claims(user_token)["iat"])
+    cached = auth.user_cache.get(cache_key)
+    
+    assert client.put(f"/api/users/{user_id}", json={"role": "parent"}, headers=headers).status_code == 200
+    # Another worker never saw the invalidation and still caches the instructor row
+    auth.user_cache.set(cache_key, cached)
+    assert client.get("/api/admin/auth-cache", headers=user_headers).status_code == 401
+
+def test_stateless_auth(monkeypatch, assert_max_queries):
+    """Test stateless tokens authorize from claims and stop working once the user's tokens are revoked"""
+    import auth
+    from jose import jwt
+    monkeypatch.setattr(auth, "AUTH_STATELESS", True)
+    
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    claims = jwt.get_unverified_claims(token)
+    assert claims["role"] == "instructor"
+    assert claims["username"] == "instructor"
+    assert isinstance(claims["ver"], int)
+    
+    client.get("/api/admin/auth-cache", headers=headers)
+    auth.user_cache.clear()
+    with assert_max_queries(0):
+        assert client.get("/api/admin/auth-cache", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).json()["username"] == "instructor"
+    
+    username = f"stateless_user_{int(time.time() * 1000)}"
+    user_id = client.post("/api/users", json={
+        "username": username,
+        "password": "secret123",
+        "role": "parent",
+        "firstName": "Stateless",
+        "lastName": "User"
+    }, headers=headers).json()["id"]
+    user_headers = {"Authorization": "Bearer " + client.post("/api/auth/login", json={
+        "username": username, "password": "secret123"
+    }).json()["accessToken"]}
+    assert client.get("/api/admin/auth-cache", headers=user_headers).status_code == 403
+    
+    # Changing the role revokes the old token, which still claims "parent"
+    assert client.put(f"/api/users/{user_id}", json={"role": "instructor"}, headers=headers).status_code == 200
+    assert client.get("/api/students", headers=user_headers).status_code == 401
+    new_token = client.post("/api/auth/login", json={"username": username, "password": "secret123"}).json()["accessToken"]
+    assert jwt.get_unverified_claims(new_token)["ver"] == 1
+    new_headers = {"Authorization": f"Bearer {new_token}"}
+    assert client.get("/api/admin/auth-cache", headers=new_headers).status_code == 200
+
+def test_pool_stats_instructor_only():
+    """Test the connection pool view is limited to instructors"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "poolClass" in response.json()
+    
+    login_response = client.post("/api/auth/login", json={
+        "username": "parent",
+        "password": "parent12377"
+    })
+    token = login_response.json()["accessToken"]
+    response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+def test_metrics_endpoint():
+    """Test /metrics reports requests by route template with their SQL statement counts"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['accessToken']}"}
+    client.get("/api/students/1", headers=headers)
+    client.get("/api/students/2", headers=headers)
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    served = next(
+        line for line in lines
+        if line.startswith('http_requests_total{method="GET",route="/api/students/{student_id}",status="200"}')
+    )
+    assert int(served.rsplit(" ", 1)[1]) >= 2
+    queries = next(
+        line for line in lines
+        if line.startswith('db_queries_per_request_sum{method="GET",route="/api/students/{student_id}"}')
+    )
+    assert int(queries.rsplit(" ", 1)[1]) >= 2
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(line.startswith("http_requests_in_progress ") for line in lines)
+
+def test_query_budgets(assert_max_queries):
+    """Test hot endpoints stay within their SQL statement budgets once caches are warm"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    headers = {"Authorization": f"Bearer {login_response.json()['accessToken']}"}
+    class_id = client.post("/api/classes", json={
+        "name": "Budget Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "friday",
+        "startTime": "06:00",
+        "endTime": "07:00"
+    }, headers=headers).json()["id"]
+    client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:1", "classId": class_id}, headers=headers)
+    
+    # Attendance insert, enrollment counter and daily rollup
+    with assert_max_queries(3):
+        response = client.post("/api/attendance/qr-scan", json={
+            "qrCode": "DOJO:1:STUDENT:2", "classId": class_id
+        }, headers=headers)
+    assert response.status_code == 200
+    
+    for path, budget in [
+        ("/api/classes", 1),
+        (f"/api/classes/{class_id}", 1),
+        ("/api/students", 1),
+        ("/api/students/1", 1),
+        ("/api/enrollments", 1),
+    ]:
+        client.get(path, headers=headers)
+        with assert_max_queries(budget):
+            assert client.get(path, headers=headers).status_code == 200
+
+def test_list_pagination():
+    """Test list endpoints page with limit/cursor and advertise the next cursor"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    all_ids = [user["id"] for user in client.get("/api/users", headers=headers).json()]
+    assert all_ids == sorted(all_ids)
+    
+    paged_ids = []
+    params = {"limit": 1}
+    while True:
+        response = client.get("/api/users", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 1
+        paged_ids.extend(user["id"] for user in page)
+        next_cursor = response.headers.get("x-next-cursor")
+        if next_cursor is None:
+            break
+        params = {"limit": 1, "cursor": next_cursor}
+    assert paged_ids == all_ids
+    
+    response = client.get("/api/attendance", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+    # Well-formed cursors holding something other than an integer id
+    for value in ("1", 1.5, True, None):
+        response = client.get("/api/classes", params={"cursor": encode_cursor(value)}, headers=headers)
+        assert response.status_code == 400
+    
+    response = client.get("/api/classes", params={"limit": 0}, headers=headers)
+    assert response.status_code == 422
+
+def test_export_ndjson(clean_enrollments):
+    """Test attendance and enrollment exports stream newline-delimited JSON"""
+    import json
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    client.post("/api/enrollments", json={
+        "studentId": 1,
+        "classId": 1,
+        "status": "enrolled",
+        "enrolledBy": 1,
+        "enrollmentDate": "2024-01-01T00:00:00Z"
+    }, headers=headers)
+    
+    response = client.get("/api/export/enrollments", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) >= 1
+    assert rows[0]["className"]
+    assert rows[0]["instructorName"]
+    
+    # May already exist from an earlier test today
+    client.post("/api/attendance/manual", json={
+        "studentId": 1,
+        "classId": 1,
+        "dojoId": 1,
+        "checkInMethod": "manual"
+    }, headers=headers)
+    
+    response = client.get("/api/export/attendance", headers=headers)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert len(lines) >= 1
+    for line in lines:
+        assert "checkInTime" in json.loads(line)
+    
+    # Parents cannot export
+    parent_token = client.post("/api/auth/login", json={
+        "username": "parent",
+        "password": "parent12377"
+    }).json()["accessToken"]
+    response = client.get("/api/export/attendance", headers={"Authorization": f"Bearer {parent_token}"})
+    assert response.status_code == 403
+
+def test_booking_capacity():
+    """Test bookings take and release class seats"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_response = client.post("/api/classes", json={
+        "name": "Private Lesson",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "thursday",
+        "startTime": "17:00",
+        "endTime": "18:00",
+        "maxCapacity": 1
+    }, headers=headers)
+    class_id = class_response.json()["id"]
+    
+    response = client.post("/api/bookings", json={"studentId": 1, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 200
+    booking_id = response.json()["id"]
+    
+    response = client.post("/api/bookings", json={"studentId": 2, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 400
+    assert "maximum capacity" in response.json()["detail"]
+    assert client.get(f"/api/classes/{class_id}", headers=headers).json()["currentEnrollment"] == 1
+    
+    # Cancelling twice only frees one seat
+    assert client.delete(f"/api/bookings/{booking_id}", headers=headers).status_code == 200
+    assert client.delete(f"/api/bookings/{booking_id}", headers=headers).status_code == 200
+    assert client.get(f"/api/classes/{class_id}", headers=headers).json()["currentEnrollment"] == 0
+    
+    response = client.post("/api/bookings", json={"studentId": 2, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 200
+    assert client.delete(f"/api/bookings/{class_id}/2", headers=headers).status_code == 200
+    assert client.get(f"/api/classes/{class_id}", headers=headers).json()["currentEnrollment"] == 0
+
+def test_catalog_etags():
+    """Test catalog endpoints answer 304 until a write bumps the table version"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    response = client.get("/api/dojos", headers=headers)
+    etag = response.headers["etag"]
+    response = client.get("/api/dojos", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    response = client.get("/api/classes", headers=headers)
+    classes_etag = response.headers["etag"]
+    assert client.get("/api/classes", headers={**headers, "If-None-Match": classes_etag}).status_code == 304
+    # Different pages get different tags
+    assert client.get("/api/classes", params={"limit": 1}, headers=headers).headers["etag"] != classes_etag
+    
+    class_id = client.post("/api/classes", json={
+        "name": "ETag Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "tuesday",
+        "startTime": "12:00",
+        "endTime": "13:00"
+    }, headers=headers).json()["id"]
+    response = client.get("/api/classes", headers={**headers, "If-None-Match": classes_etag})
+    assert response.status_code == 200
+    assert class_id in [cls["id"] for cls in response.json()]
+    
+    # Taking a seat changes currentEnrollment, so the class tag changes too
+    class_etag = client.get(f"/api/classes/{class_id}", headers=headers).headers["etag"]
+    assert client.get(f"/api/classes/{class_id}", headers={**headers, "If-None-Match": class_etag}).status_code == 304
+    assert client.post("/api/bookings", json={"studentId": 1, "classId": class_id, "bookedBy": 1}, headers=headers).status_code == 200
+    response = client.get(f"/api/classes/{class_id}", headers={**headers, "If-None-Match": class_etag})
+    assert response.status_code == 200
+    assert response.json()["currentEnrollment"] == 1
+
+def test_catalog_cache_invalidation():
+    """Test class lookups are served from the catalog cache and dropped when the class is deleted"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_id = client.post("/api/classes", json={
+        "name": "Cached Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "saturday",
+        "startTime": "08:00",
+        "endTime": "09:00"
+    }, headers=headers).json()["id"]
+    
+    before = client.get("/api/admin/catalog-cache", headers=headers).json()
+    response = client.post("/api/bookings", json={"studentId": 1, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 200
+    assert client.delete(f"/api/bookings/{response.json()['id']}", headers=headers).status_code == 200
+    response = client.post("/api/bookings", json={"studentId": 1, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 200
+    after = client.get("/api/admin/catalog-cache", headers=headers).json()
+    assert after["hits"] >= before["hits"] + 1
+    
+    assert client.delete(f"/api/classes/{class_id}", headers=headers).status_code == 200
+    response = client.post("/api/bookings", json={"studentId": 2, "classId": class_id, "bookedBy": 1}, headers=headers)
+    assert response.status_code == 404
+
+def test_dojo_schedule():
+    """Test the dojo schedule follows class writes and answers what is on now and next"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    response = client.get("/api/dojos/1/schedule", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get("/api/dojos/1/schedule", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/api/dojos/999999/schedule", headers=headers).status_code == 404
+    
+    # Sunday night class running past midnight into Monday
+    class_id = client.post("/api/classes", json={
+        "name": "Late Night Randori",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "sunday",
+        "startTime": "23:30",
+        "endTime": "00:30"
+    }, headers=headers).json()["id"]
+    
+    def current(at):
+        now = client.get("/api/dojos/1/schedule/now", params={"at": at}, headers=headers).json()
+        return {entry["classId"]: entry for entry in now["current"]}
+    
+    def next_start(at):
+        return client.get("/api/dojos/1/schedule/now", params={"at": at}, headers=headers).json()["next"]["startsAt"]
+    
+    try:
+        response = client.get("/api/dojos/1/schedule", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        schedule = response.json()
+        assert class_id in [entry["classId"] for entry in schedule]
+        days = [entry["dayOfWeek"] for entry in schedule]
+        assert days == sorted(days, key=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"].index)
+        
+        # 2026-10-19 is a Monday
+        response = client.get("/api/dojos/1/schedule/now", params={"at": "2026-10-19T00:15:00"}, headers=headers)
+        assert response.status_code == 200
+        late_night = current("2026-10-19T00:15:00")[class_id]
+        assert late_night["startsAt"] == "2026-10-18T23:30:00"
+        assert late_night["endsAt"] == "2026-10-19T00:30:00"
+        # Other classes in the dojo may start at the same minute, never earlier
+        assert next_start("2026-10-18T23:29:00") == "2026-10-18T23:30:00"
+        
+        assert client.put(f"/api/classes/{class_id}", json={
+            "dayOfWeek": "monday", "startTime": "05:00", "endTime": "06:00"
+        }, headers=headers).status_code == 200
+        assert class_id not in current("2026-10-19T00:15:00")
+        assert class_id in current("2026-10-19T05:15:00")
+        assert next_start("2026-10-19T04:59:00") == "2026-10-19T05:00:00"
+    finally:
+        assert client.delete(f"/api/classes/{class_id}", headers=headers).status_code == 200
+    schedule = client.get("/api/dojos/1/schedule", headers=headers).json()
+    assert class_id not in [entry["classId"] for entry in schedule]
+
+def test_attendance_count_follows_check_ins():
+    """Test check-ins and attendance deletions keep the enrollment's attendance count in step"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_id = client.post("/api/classes", json={
+        "name": "Counted Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "wednesday",
+        "startTime": "07:00",
+        "endTime": "08:00"
+    }, headers=headers).json()["id"]
+    response = client.post("/api/enrollments", json={
+        "studentId": 2,
+        "classId": class_id,
+        "status": "enrolled",
+        "enrolledBy": 1,
+        "enrollmentDate": "2024-01-01T00:00:00Z"
+    }, headers=headers)
+    assert response.status_code == 200
+    
+    enrollment_id = response.json()["id"]
+    
+    def attendance_count():
+        enrollments = client.get("/api/students/2/enrollments", headers=headers).json()
+        return next(
+            e["attendanceCount"] for e in enrollments
+            if e["classId"] == class_id and e["status"] == "enrolled"
+        )
+    
+    response = client.post("/api/attendance/qr-scan", json={
+        "qrCode": "DOJO:1:STUDENT:2",
+        "classId": class_id
+    }, headers=headers)
+    assert response.status_code == 200
+    attendance_id = response.json()["id"]
+    assert attendance_count() == 1
+    
+    # A rejected duplicate does not count
+    client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:2", "classId": class_id}, headers=headers)
+    assert attendance_count() == 1
+    
+    assert client.delete(f"/api/attendance/{attendance_id}", headers=headers).status_code == 200
+    assert attendance_count() == 0
+    assert client.delete(f"/api/attendance/{attendance_id}", headers=headers).status_code == 404
+    
+    response = client.post("/api/attendance/qr-scan/batch", json=[
+        {"qrCode": "DOJO:1:STUDENT:2", "classId": class_id}
+    ], headers=headers)
+    assert response.json()[0]["status"] == "checked_in"
+    assert attendance_count() == 1
+    earlier_attendance_id = response.json()[0]["attendance"]["id"]
+    
+    # A check-in from before a re-enrollment belongs to the old enrollment,
+    # so deleting it leaves the new one's count alone
+    assert client.put(f"/api/enrollments/{enrollment_id}", json={"status": "dropped"}, headers=headers).status_code == 200
+    response = client.post("/api/enrollments", json={
+        "studentId": 2,
+        "classId": class_id,
+        "status": "enrolled",
+        "enrolledBy": 1,
+        "enrollmentDate": (datetime.now() + timedelta(minutes=1)).isoformat(),
+        "attendanceCount": 1
+    }, headers=headers)
+    assert response.status_code == 200
+    assert client.delete(f"/api/attendance/{earlier_attendance_id}", headers=headers).status_code == 200
+    assert attendance_count() == 1
+
+def test_attendance_stats():
+    """Test the stats endpoint counts check-ins from the daily rollup and follows deletions"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_id = client.post("/api/classes", json={
+        "name": "Stats Class",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "thursday",
+        "startTime": "06:00",
+        "endTime": "07:00"
+    }, headers=headers).json()["id"]
+    client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:1", "classId": class_id}, headers=headers)
+    manual = client.post("/api/attendance/manual", json={
+        "studentId": 2,
+        "classId": class_id,
+        "dojoId": 1,
+        "checkInMethod": "manual"
+    }, headers=headers).json()
+    
+    today = datetime.now().date()
+    params = {"class_id": class_id, "group_by": ["class", "method"]}
+    response = client.get("/api/attendance/stats", params=params, headers=headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert {(s["checkInMethod"], s["count"]) for s in stats} == {("manual", 1), ("qr_code", 1)}
+    assert all(s["periodStart"] == today.isoformat() and s["classId"] == class_id for s in stats)
+    assert all(s["dojoId"] is None for s in stats)
+    
+    response = client.get("/api/attendance/stats", params={"class_id": class_id, "period": "week"}, headers=headers)
+    monday = today - timedelta(days=today.weekday())
+    assert response.json() == [{
+        "periodStart": monday.isoformat(), "classId": None, "dojoId": None, "checkInMethod": None, "count": 2
+    }]
+    
+    assert client.delete(f"/api/attendance/{manual['id']}", headers=headers).status_code == 200
+    response = client.get("/api/attendance/stats", params=params, headers=headers)
+    assert [(s["checkInMethod"], s["count"]) for s in response.json()] == [("qr_code", 1)]
+    
+    yesterday = (today - timedelta(days=1)).isoformat()
+    response = client.get("/api/attendance/stats", params={"class_id": class_id, "end": yesterday}, headers=headers)
+    assert response.json() == []
+    response = client.get("/api/attendance/stats", params={"start": today.isoformat(), "end": yesterday}, headers=headers)
+    assert response.status_code == 400
+
+def test_qr_code_scan():
+    """Test QR check-in validates the student and class and rejects same-day duplicates"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_id = client.post("/api/classes", json={
+        "name": "Open Mat",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "saturday",
+        "startTime": "10:00",
+        "endTime": "12:00"
+    }, headers=headers).json()["id"]
+    
+    response = client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:1", "classId": class_id}, headers=headers)
+    assert response.status_code == 200
+    attendance = response.json()
+    assert attendance["studentId"] == 1
+    assert attendance["classId"] == class_id
+    assert attendance["dojoId"] == 1
+    assert attendance["checkInMethod"] == "qr_code"
+    assert attendance["checkedInBy"] == 1
+    assert attendance["id"] and attendance["createdAt"]
+    
+    response = client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:1", "classId": class_id}, headers=headers)
+    assert response.status_code == 400
+    
+    response = client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:999999", "classId": class_id}, headers=headers)
+    assert response.status_code == 404
+    
+    response = client.post("/api/attendance/qr-scan", json={"qrCode": "DOJO:1:STUDENT:1", "classId": 999999}, headers=headers)
+    assert response.status_code == 404
+
+def test_qr_code_scan_batch():
+    """Test batch QR check-in reports a result per scan"""
+    login_response = client.post("/api/auth/login", json={
+        "username": "instructor",
+        "password": "password12377"
+    })
+    token = login_response.json()["accessToken"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    class_id = client.post("/api/classes", json={
+        "name": "Kiosk Replay",
+        "instructorId": 1,
+        "dojoId": 1,
+        "dayOfWeek": "sunday",
+        "startTime": "09:00",
+        "endTime": "10:00"
+    }, headers=headers).json()["id"]
+    
+    response = client.post("/api/attendance/qr-scan/batch", json=[
+        {"qrCode": "DOJO:1:STUDENT:1", "classId": class_id},
+        {"qrCode": "DOJO:1:STUDENT:2", "classId": class_id},
+        {"qrCode": "DOJO:1:STUDENT:1", "classId": class_id},
+        {"qrCode": "DOJO:1:STUDENT:999999", "classId": class_id},
+        {"qrCode": "DOJO:1:STUDENT:2", "classId": 999999}
+    ], headers=headers)
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["status"] for r in results] == [
+        "checked_in", "checked_in", "duplicate", "student_not_found", "class_not_found"
+    ]
+    assert results[0]["attendance"]["studentId"] == 1
+    assert results[1]["attendance"]["studentId"] == 2
+    assert results[2]["attendance"] is None
+    
+    # Replaying the same batch only finds duplicates
+    response = client.post("/api/attendance/qr-scan/batch", json=[
+        {"qrCode": "DOJO:1:STUDENT:1", "classId": class_id},
+        {"qrCode": "DOJO:1:STUDENT:2", "classId": class_id}
+    ], headers=headers)
+    assert [r["status"] for r in response.json()] == ["duplicate", "duplicate"]
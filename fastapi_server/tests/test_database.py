@@ -0,0 +1,662 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+import pytest
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, event, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from database import engine, engine_options, init_db, migrate, pool_stats, writer_engine, AsyncSessionLocal, EngineSettings, Attendance, AttendanceDaily, Booking, Class, Enrollment, Student, TableVersion
+from capacity import reserve_seat, release_seat, hand_over_seat
+from queries import count_where, exists_where
+from checkin import reconcile_attendance_counts
+from rollups import rebuild_daily_counts, record_daily_counts
+import asyncio
+import subprocess
+import tempfile
+from querycount import count_queries
+
+sqlite_only = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="query plan assertions use SQLite EXPLAIN QUERY PLAN"
+)
+sqlite_file_only = pytest.mark.skipif(
+    writer_engine is engine, reason="needs the SQLite file profile with a separate writer engine"
+)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_schema():
+    """Make sure tables and indexes exist before inspecting query plans"""
+    asyncio.run(migrate())
+
+def explain(stmt):
+    """Return the detail column of SQLite's EXPLAIN QUERY PLAN for stmt"""
+    async def run():
+        async with engine.connect() as conn:
+            compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)
+            return [row[-1] for row in result]
+    return asyncio.run(run())
+
+def assert_uses_index(stmt, index_name):
+    plan = explain(stmt)
+    assert any(index_name in line for line in plan), plan
+    assert not any(line.startswith("SCAN") for line in plan), plan
+
+def test_migrate_is_idempotent():
+    """Test running the migration again creates nothing new"""
+    assert asyncio.run(migrate()) == []
+
+def test_migrate_drops_obsolete_indexes():
+    """Test migrating a database that still has a dropped index removes it"""
+    async def run():
+        async with writer_engine.begin() as conn:
+            await conn.execute(text("CREATE INDEX ix_enrollments_class_status ON enrollments (class_id, status)"))
+        await migrate()
+        async with engine.connect() as conn:
+            return await conn.run_sync(
+                lambda sync_conn: sync_conn.dialect.has_index(sync_conn, "enrollments", "ix_enrollments_class_status")
+            )
+    
+    assert asyncio.run(run()) is False
+
+def test_count_and_exists_helpers():
+    """Test the COUNT/EXISTS helpers against a known set of rows"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            session.add_all([
+                Booking(student_id=900001, class_id=900001, booked_by=1, is_active=active)
+                for active in (True, True, False)
+            ])
+            await session.flush()
+            active = await count_where(session, Booking, Booking.student_id == 900001, Booking.is_active == True)
+            any_rows = await exists_where(session, Booking, Booking.student_id == 900001)
+            no_rows = await exists_where(session, Booking, Booking.student_id == 900002)
+            await session.rollback()
+            return active, any_rows, no_rows
+    
+    assert asyncio.run(run()) == (2, True, False)
+
+@sqlite_only
+def test_attendance_duplicate_check_uses_index():
+    """Test the same-day check-in lookup in qr_code_scan/manual_checkin"""
+    stmt = select(Attendance).where(
+        Attendance.student_id == 1,
+        Attendance.class_id == 1,
+        Attendance.check_in_time >= date.today()
+    )
+    assert_uses_index(stmt, "ix_attendance_student_class_check_in")
+
+@sqlite_only
+def test_attendance_by_student_uses_index():
+    """Test delete_student and get_student_attendance lookups"""
+    stmt = select(Attendance).where(Attendance.student_id == 1)
+    plan = explain(stmt)
+    # Either index leads with student_id
+    assert any(
+        "ix_attendance_student_class_check_in" in line or "uq_attendance_student_class_date" in line
+        for line in plan
+    ), plan
+    assert not any(line.startswith("SCAN") for line in plan), plan
+
+@sqlite_only
+def test_booking_lookups_use_index():
+    """Test duplicate-booking and active-booking lookups"""
+    stmt = select(Booking).where(
+        Booking.student_id == 1,
+        Booking.class_id == 1,
+        Booking.is_active == True
+    )
+    assert_uses_index(stmt, "ix_bookings_student_class_active")
+    stmt = select(Booking).where(Booking.student_id == 1, Booking.is_active == True)
+    assert_uses_index(stmt, "ix_bookings_student_class_active")
+
+@sqlite_only
+def test_enrollment_lookups_use_index():
+    """Test enrollment duplicate checks and per-class status counts"""
+    stmt = select(Enrollment).where(
+        Enrollment.student_id == 1,
+        Enrollment.class_id == 1,
+        Enrollment.status.in_(["enrolled", "waitlisted"])
+    )
+    assert_uses_index(stmt, "ix_enrollments_student_class_status")
+    stmt = select(Enrollment).where(Enrollment.class_id == 1, Enrollment.status == "enrolled")
+    assert_uses_index(stmt, "ix_enrollments_class_status_date")
+
+@sqlite_only
+def test_waitlist_lookup_uses_index():
+    """Test finding the longest-waiting enrollment reads the waitlist index in order"""
+    stmt = (
+        select(Enrollment.id)
+        .where(Enrollment.class_id == 1, Enrollment.status == "waitlisted")
+        .order_by(Enrollment.enrollment_date, Enrollment.id)
+        .limit(1)
+    )
+    plan = explain(stmt)
+    assert any("ix_enrollments_class_status_date" in line for line in plan), plan
+    assert not any("TEMP B-TREE" in line for line in plan), plan
+
+@sqlite_only
+def test_student_lookups_use_index():
+    """Test parent and student-user lookups"""
+    assert_uses_index(select(Student).where(Student.parent_id == 2), "ix_students_parent_id")
+    assert_uses_index(select(Student).where(Student.user_id == 3), "ix_students_user_id")
+
+@sqlite_only
+def test_parent_classes_join_uses_index():
+    """Test the classes-at-my-children's-dojo join in get_classes"""
+    stmt = (
+        select(Class).distinct().join(Student, Class.dojo_id == Student.dojo_id)
+        .where(Student.parent_id == 2)
+    )
+    plan = explain(stmt)
+    assert any("ix_students_parent_id" in line for line in plan), plan
+    assert any("ix_classes_dojo_id" in line for line in plan), plan
+
+def test_seat_change_bumps_version_after_commit():
+    """Test a seat change leaves table_versions out of its transaction and bumps it once committed"""
+    from versions import publish_version_bumps
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    async def class_seats_version(session):
+        return (await session.execute(
+            select(TableVersion.version).where(TableVersion.name == "class_seats")
+        )).scalar()
+    
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Version Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="thursday",
+                start_time="18:00",
+                end_time="19:00",
+                max_capacity=5
+            )
+            session.add(cls)
+            await session.commit()
+            before = await class_seats_version(session)
+            await session.commit()
+            
+            targets = {engine.sync_engine, writer_engine.sync_engine}
+            for target in targets:
+                event.listen(target, "before_cursor_execute", record)
+            try:
+                assert await reserve_seat(session, cls.id)
+                await session.commit()
+            finally:
+                for target in targets:
+                    event.remove(target, "before_cursor_execute", record)
+            await publish_version_bumps(session)
+            after = await class_seats_version(session)
+            
+            await session.execute(delete(Class).where(Class.id == cls.id))
+            await session.commit()
+            return after - before
+    
+    assert asyncio.run(run()) == 1
+    assert statements and not any("table_versions" in statement for statement in statements)
+
+def test_concurrent_seat_reservations_never_overbook():
+    """Test hundreds of parallel reservations against one class fill it exactly"""
+    capacity = 15
+    
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Stress Test Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="friday",
+                start_time="18:00",
+                end_time="19:00",
+                max_capacity=capacity
+            )
+            session.add(cls)
+            await session.commit()
+            class_id = cls.id
+        
+        async def attempt(change):
+            async with AsyncSessionLocal() as session:
+                changed = await change(session, class_id)
+                await session.commit()
+                return changed
+        
+        async def book():
+            return await attempt(reserve_seat)
+        
+        async def cancel():
+            return await attempt(release_seat)
+        
+        booked = await asyncio.gather(*(book() for _ in range(300)))
+        async with AsyncSessionLocal() as session:
+            after_booking = await session.get(Class, class_id)
+        
+        cancelled = await asyncio.gather(*(cancel() for _ in range(300)))
+        async with AsyncSessionLocal() as session:
+            after_cancelling = await session.get(Class, class_id)
+            await session.delete(after_cancelling)
+            await session.commit()
+        
+        return booked, after_booking.current_enrollment, cancelled, after_cancelling.current_enrollment
+    
+    booked, booked_count, cancelled, final_count = asyncio.run(run())
+    assert booked.count(True) == capacity
+    assert booked_count == capacity
+    assert cancelled.count(True) == capacity
+    assert final_count == 0
+
+def test_concurrent_drops_promote_waitlist_in_order():
+    """Test parallel drops from a full class each hand their seat to the next waitlisted student"""
+    capacity = 5
+    waiting = 8
+    
+    async def run():
+        # The pools' wait queues belong to the event loop of the last test
+        # that contended for a connection
+        await engine.dispose()
+        await writer_engine.dispose()
+        joined = datetime(2024, 1, 1)
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Waitlist Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="friday",
+                start_time="20:00",
+                end_time="21:00",
+                max_capacity=capacity,
+                current_enrollment=capacity
+            )
+            session.add(cls)
+            await session.flush()
+            enrolled = [
+                Enrollment(student_id=1, class_id=cls.id, status="enrolled", enrolled_by=1, enrollment_date=joined)
+                for _ in range(capacity)
+            ]
+            # Join the waitlist newest first, so FIFO order differs from id order
+            waitlisted = [
+                Enrollment(
+                    student_id=2, class_id=cls.id, status="waitlisted", enrolled_by=1,
+                    enrollment_date=joined + timedelta(days=waiting - i)
+                )
+                for i in range(waiting)
+            ]
+            session.add_all(enrolled + waitlisted)
+            await session.commit()
+            class_id = cls.id
+        
+        async def drop(enrollment_id):
+            async with AsyncSessionLocal() as session:
+                await session.execute(delete(Enrollment).where(Enrollment.id == enrollment_id))
+                promoted = await hand_over_seat(session, class_id)
+                await session.commit()
+                return promoted
+        
+        promoted = await asyncio.gather(*(drop(enrollment.id) for enrollment in enrolled))
+        async with AsyncSessionLocal() as session:
+            count = (await session.get(Class, class_id)).current_enrollment
+            statuses = {
+                row.id: row.status for row in await session.execute(
+                    select(Enrollment.id, Enrollment.status).where(Enrollment.class_id == class_id)
+                )
+            }
+            await session.execute(delete(Enrollment).where(Enrollment.class_id == class_id))
+            await session.execute(delete(Class).where(Class.id == class_id))
+            await session.commit()
+        
+        first_in_line = [enrollment.id for enrollment in reversed(waitlisted)][:capacity]
+        return promoted, first_in_line, count, statuses
+    
+    promoted, first_in_line, count, statuses = asyncio.run(run())
+    assert sorted(promoted) == sorted(first_in_line)
+    assert count == capacity
+    assert sorted(id for id, status in statuses.items() if status == "enrolled") == sorted(first_in_line)
+    assert list(statuses.values()).count("waitlisted") == waiting - capacity
+
+def test_engine_options_from_settings():
+    """Test pool settings apply to server databases and echo is off by default"""
+    settings = EngineSettings(pool_size=20, max_overflow=5, statement_cache_size=0)
+    assert settings.echo is False
+    
+    options = engine_options("postgresql+asyncpg://user@localhost/dojo", settings)
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 5
+    assert options["connect_args"] == {"prepared_statement_cache_size": 0, "statement_cache_size": 0}
+    
+    file_options = engine_options("sqlite+aiosqlite:///./dojo.db", settings)
+    assert issubclass(file_options["poolclass"], AsyncAdaptedQueuePool)
+    assert file_options["pool_size"] == 20
+    assert engine_options("sqlite+aiosqlite://", settings) == {"echo": False}
+
+def test_pool_stats():
+    """Test pool stats report queue pool counters"""
+    settings = EngineSettings(pool_size=3, max_overflow=2)
+    url = "postgresql+asyncpg://user@localhost/dojo"
+    pg_engine = create_async_engine(url, **engine_options(url, settings))
+    stats = pool_stats(pg_engine)
+    assert stats["size"] == 3
+    assert stats["maxOverflow"] == 2
+    assert stats["checkedOut"] == 0
+    assert stats["poolClass"] == "TimedQueuePool"
+
+def test_version_refresh_reuses_request_connection():
+    """Test refreshing table versions through a session opens no second connection"""
+    import versions
+    checkouts = []
+    
+    def count_checkout(*args):
+        checkouts.append(1)
+    
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await session.execute(select(Student.id).limit(1))
+            versions._loaded_at = float("-inf")
+            event.listen(engine.sync_engine, "checkout", count_checkout)
+            try:
+                return await versions.current_versions(session)
+            finally:
+                event.remove(engine.sync_engine, "checkout", count_checkout)
+    
+    assert "classes" in asyncio.run(run())
+    assert checkouts == []
+
+def test_import_reads_body_before_touching_database(monkeypatch):
+    """Test a bulk import opens no transaction until every row has arrived"""
+    import student_import
+    monkeypatch.setattr(student_import, "IMPORT_CHUNK_SIZE", 2)
+    
+    async def run():
+        async with AsyncSessionLocal() as session:
+            in_transaction = []
+            
+            async def rows():
+                for age in (8, 9, 10):
+                    in_transaction.append(session.in_transaction())
+                    yield {"dojoId": 1, "age": age}
+            
+            try:
+                created = await student_import.import_students(session, rows())
+                return in_transaction, len(created)
+            finally:
+                await session.rollback()
+    
+    assert asyncio.run(run()) == ([False, False, False], 3)
+
+@sqlite_file_only
+def test_sqlite_connections_use_wal_pragmas():
+    """Test reader and writer connections come up in WAL mode with the tuned pragmas"""
+    async def run():
+        values = []
+        for target in (engine, writer_engine):
+            async with target.connect() as conn:
+                values.append((
+                    (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar(),
+                    (await conn.exec_driver_sql("PRAGMA synchronous")).scalar(),
+                    (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar(),
+                ))
+        return values
+    
+    # synchronous=NORMAL reads back as 1
+    assert asyncio.run(run()) == [("wal", 1, 5000), ("wal", 1, 5000)]
+
+@sqlite_file_only
+def test_session_routes_writes_to_writer():
+    """Test reads use the reader pool until the transaction writes"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            sync_session = session.sync_session
+            read_bind = sync_session.get_bind(clause=select(Class))
+            await reserve_seat(session, 1)
+            after_write = sync_session.get_bind(clause=select(Class))
+            await session.rollback()
+            after_rollback = sync_session.get_bind(clause=select(Class))
+            return read_bind, after_write, after_rollback
+    
+    read_bind, after_write, after_rollback = asyncio.run(run())
+    assert read_bind is engine.sync_engine
+    assert after_write is writer_engine.sync_engine
+    assert after_rollback is engine.sync_engine
+
+def test_reconcile_attendance_counts():
+    """Test reconciling rebuilds enrolled enrollments' counters from attendance"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Reconcile Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="monday",
+                start_time="06:00",
+                end_time="07:00"
+            )
+            session.add(cls)
+            await session.flush()
+            enrolled = Enrollment(
+                student_id=1, class_id=cls.id, status="enrolled", enrolled_by=1,
+                enrollment_date=date(2024, 1, 1), attendance_count=7
+            )
+            dropped = Enrollment(
+                student_id=2, class_id=cls.id, status="dropped", enrolled_by=1,
+                enrollment_date=date(2024, 1, 1), attendance_count=7
+            )
+            session.add_all([enrolled, dropped])
+            session.add_all([
+                Attendance(student_id=1, class_id=cls.id, dojo_id=1, check_in_method="manual",
+                           check_in_time=datetime(2024, 1, day, 6, 0))
+                for day in (2, 3, 4)
+            ])
+            # Before the enrollment began, so it is not counted
+            session.add(Attendance(
+                student_id=1, class_id=cls.id, dojo_id=1, check_in_method="manual",
+                check_in_time=datetime(2023, 12, 31, 18, 0)
+            ))
+            await session.commit()
+            
+            changed = await reconcile_attendance_counts(session)
+            await session.commit()
+            again = await reconcile_attendance_counts(session)
+            await session.refresh(enrolled)
+            await session.refresh(dropped)
+            return changed, again, enrolled.attendance_count, dropped.attendance_count
+    
+    changed, again, enrolled_count, dropped_count = asyncio.run(run())
+    assert changed >= 1
+    assert again == 0
+    assert enrolled_count == 3
+    assert dropped_count == 7
+
+def test_check_in_conflict_is_reported_as_duplicate():
+    """Test a same-day check-in that slips past the lookup is stopped by the unique index"""
+    from fastapi import HTTPException
+    from checkin import check_in, check_in_batch
+    from models import QRCodeScanRequest, QRCodeScanStatus
+    
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Race Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="friday",
+                start_time="06:00",
+                end_time="07:00"
+            )
+            session.add(cls)
+            await session.commit()
+            class_id = cls.id
+            try:
+                # What a concurrent scan committed after this one's lookup ran:
+                # today's row, but outside the lookup's check_in_time window
+                for student_id in (1, 2):
+                    session.add(Attendance(
+                        student_id=student_id, class_id=class_id, dojo_id=1, check_in_method="qr_code",
+                        check_in_time=datetime.now() - timedelta(days=1), check_in_date=date.today()
+                    ))
+                await session.commit()
+                
+                try:
+                    await check_in(session, Student.id == 1, class_id, "manual", checked_in_by=1)
+                except HTTPException as error:
+                    single = error.status_code
+                await session.rollback()
+                
+                results = await check_in_batch(
+                    session, [QRCodeScanRequest(qrCode="DOJO:1:STUDENT:2", classId=class_id)], checked_in_by=1
+                )
+                await session.rollback()
+                return single, results
+            finally:
+                await session.execute(delete(Attendance).where(Attendance.class_id == class_id))
+                await session.execute(delete(Class).where(Class.id == class_id))
+                await session.commit()
+    
+    single, results = asyncio.run(run())
+    assert single == 400
+    assert results == [(QRCodeScanStatus.DUPLICATE, None)]
+
+def test_migrate_adds_missing_columns():
+    """Test migrating an attendance table from before check_in_date adds the column"""
+    from database import add_missing_columns
+    
+    async def run():
+        old_engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            async with old_engine.begin() as conn:
+                await conn.exec_driver_sql(
+                    "CREATE TABLE attendance (id INTEGER PRIMARY KEY, student_id INTEGER, class_id INTEGER,"
+                    " dojo_id INTEGER, check_in_time DATETIME, check_in_method VARCHAR(20), notes TEXT,"
+                    " checked_in_by INTEGER, created_at DATETIME)"
+                )
+                added = await conn.run_sync(add_missing_columns)
+                again = await conn.run_sync(add_missing_columns)
+            return added, again
+        finally:
+            await old_engine.dispose()
+    
+    assert asyncio.run(run()) == (["attendance.check_in_date"], [])
+
+def test_rebuild_daily_counts():
+    """Test rebuilding the rollup recounts attendance per day, class, dojo and method"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Rollup Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="monday",
+                start_time="18:00",
+                end_time="19:00"
+            )
+            session.add(cls)
+            await session.commit()
+            class_id = cls.id
+            try:
+                session.add_all([
+                    Attendance(student_id=1, class_id=class_id, dojo_id=1, check_in_method="manual",
+                               check_in_time=datetime(2024, 3, 4, 18, 0)),
+                    Attendance(student_id=2, class_id=class_id, dojo_id=1, check_in_method="manual",
+                               check_in_time=datetime(2024, 3, 4, 19, 30)),
+                    Attendance(student_id=1, class_id=class_id, dojo_id=1, check_in_method="qr_code",
+                               check_in_time=datetime(2024, 3, 5, 18, 0)),
+                ])
+                await session.commit()
+                
+                await rebuild_daily_counts(session)
+                await session.commit()
+                result = await session.execute(
+                    select(AttendanceDaily.day, AttendanceDaily.check_in_method, AttendanceDaily.count)
+                    .where(AttendanceDaily.class_id == class_id)
+                    .order_by(AttendanceDaily.day)
+                )
+                return [tuple(row) for row in result.all()]
+            finally:
+                await session.rollback()
+                await session.execute(delete(Attendance).where(Attendance.class_id == class_id))
+                await session.execute(delete(AttendanceDaily).where(AttendanceDaily.class_id == class_id))
+                await session.execute(delete(Class).where(Class.id == class_id))
+                await session.commit()
+    
+    assert asyncio.run(run()) == [
+        (date(2024, 3, 4), "manual", 2),
+        (date(2024, 3, 5), "qr_code", 1),
+    ]
+
+def test_daily_counts_commute():
+    """Test a rollup decrement that runs before its increment still nets out"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            cls = Class(
+                name="Rollup Order Class",
+                instructor_id=1,
+                dojo_id=1,
+                day_of_week="tuesday",
+                start_time="18:00",
+                end_time="19:00"
+            )
+            session.add(cls)
+            await session.commit()
+            class_id = cls.id
+        
+        record = Attendance(student_id=1, class_id=class_id, dojo_id=1, check_in_method="manual",
+                            check_in_time=datetime(2024, 3, 5, 18, 0))
+        counts = []
+        try:
+            for delta in (-1, 1):
+                await record_daily_counts([record], delta)
+                async with AsyncSessionLocal() as session:
+                    counts.append((await session.execute(
+                        select(AttendanceDaily.count).where(AttendanceDaily.class_id == class_id)
+                    )).scalar())
+            return counts
+        finally:
+            async with AsyncSessionLocal() as session:
+                await session.execute(delete(AttendanceDaily).where(AttendanceDaily.class_id == class_id))
+                await session.execute(delete(Class).where(Class.id == class_id))
+                await session.commit()
+    
+    assert asyncio.run(run()) == [-1, 0]
+
+def test_init_db_on_current_schema_is_one_query():
+    """Test startup on an up-to-date database only reads the schema version"""
+    asyncio.run(migrate())
+    with count_queries() as log:
+        migrated = asyncio.run(init_db(seed=False))
+    assert migrated is False
+    assert len(log) == 1, str(log)
+
+INIT_SCRIPT = """
+import asyncio, sys
+sys.path.insert(0, sys.argv[1])
+from database import init_db
+print(asyncio.run(init_db(seed=True)))
+"""
+
+def test_concurrent_init_migrates_and_seeds_once():
+    """Test workers booting together against a new database migrate and seed it exactly once"""
+    root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/boot.db")
+    procs = [
+        subprocess.Popen([sys.executable, "-c", INIT_SCRIPT, root], env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    results = [proc.communicate(timeout=120)[0].strip() for proc in procs]
+    assert all(proc.returncode == 0 for proc in procs)
+    assert sorted(results) == ["False", "False", "False", "True"]
+    
+    check = subprocess.run([sys.executable, "-c", """
+import asyncio, sys
+sys.path.insert(0, sys.argv[1])
+from sqlalchemy import func, select
+from database import AsyncSessionLocal, User
+async def count():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(func.count()).select_from(User))).scalar()
+print(asyncio.run(count()))
+""", root], env=env, stdout=subprocess.PIPE, text=True, check=True)
+    assert check.stdout.strip() == "3"
@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+import asyncio
+import metrics
+from jobs import JobQueue
+
+def make_queue(maxsize=10, workers=1, max_attempts=3):
+    return JobQueue(maxsize, workers, max_attempts, retry_delay=0)
+
+def test_enqueue_runs_inline_until_started():
+    """Test a queue that was never started runs jobs in the caller"""
+    ran = []
+
+    async def job(value):
+        ran.append(value)
+
+    async def run():
+        queue = make_queue()
+        await queue.enqueue("inline", job, 1)
+        return list(ran)
+
+    assert asyncio.run(run()) == [1]
+
+def test_stop_drains_queued_jobs():
+    """Test queued jobs run in the background and shutdown waits for them"""
+    ran = []
+
+    async def job(value):
+        await asyncio.sleep(0.01)
+        ran.append(value)
+
+    async def run():
+        queue = make_queue(workers=2)
+        queue.start()
+        for value in range(5):
+            await queue.enqueue("drain", job, value)
+        queued = list(ran)
+        await queue.stop(timeout=5)
+        return queued, queue.running
+
+    queued, running = asyncio.run(run())
+    assert queued == []
+    assert sorted(ran) == [0, 1, 2, 3, 4]
+    assert not running
+    assert 'job_queue_lag_seconds_count{job="drain"} 5' in metrics.render()
+
+def test_failing_job_is_retried():
+    """Test a job is retried until it succeeds or runs out of attempts"""
+    attempts = []
+
+    async def flaky():
+        attempts.append("flaky")
+        if attempts.count("flaky") < 2:
+            raise RuntimeError("transient")
+
+    async def broken():
+        attempts.append("broken")
+        raise RuntimeError("permanent")
+
+    async def run():
+        queue = make_queue(max_attempts=3)
+        queue.start()
+        await queue.enqueue("flaky", flaky)
+        await queue.enqueue("broken", broken)
+        await queue.stop(timeout=5)
+
+    asyncio.run(run())
+    assert attempts.count("flaky") == 2
+    assert attempts.count("broken") == 3
+    rendered = metrics.render()
+    assert 'jobs_total{job="flaky",outcome="succeeded"} 1' in rendered
+    assert 'jobs_total{job="broken",outcome="failed"} 1' in rendered
+
+def test_full_queue_runs_job_inline():
+    """Test enqueueing onto a full queue runs the job in the caller instead of dropping it"""
+    ran = []
+
+    async def run():
+        blocker = asyncio.Event()
+
+        async def slow():
+            await blocker.wait()
+            ran.append("slow")
+
+        async def job(value):
+            ran.append(value)
+
+        queue = make_queue(maxsize=1, workers=1)
+        queue.start()
+        await queue.enqueue("slow", slow)
+        await asyncio.sleep(0)  # the worker takes the slow job
+        await queue.enqueue("queued", job, "queued")
+        await queue.enqueue("overflow", job, "overflow")
+        inline = list(ran)
+        blocker.set()
+        await queue.stop(timeout=5)
+        return inline
+
+    assert asyncio.run(run()) == ["overflow"]
+    assert ran == ["overflow", "slow", "queued"]
+    assert 'jobs_inline_total{job="overflow"} 1' in metrics.render()
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+import asyncio
+import warnings
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import select
+from database import get_db, init_db, Student
+import querycount
+from querycount import RepeatedQueryMiddleware, RepeatedQueryWarning, count_queries
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_database():
+    asyncio.run(init_db())
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(RepeatedQueryMiddleware)
+
+    @app.get("/students/{times}")
+    async def load_one_by_one(times: int, db=Depends(get_db)):
+        for student_id in range(times):
+            await db.execute(select(Student.id).where(Student.id == student_id))
+        return {}
+
+    return app
+
+def request(app, path):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(run())
+
+def test_count_queries_collects_statements():
+    """Test the query log sees each statement and reports repeats"""
+    app = make_app()
+    with count_queries() as log:
+        assert request(app, "/students/3").status_code == 200
+    assert len(log) == 3
+    assert list(log.repeated(3).values()) == [3]
+    assert log.repeated(4) == {}
+
+def test_repeated_statement_warns(monkeypatch):
+    """Test a request repeating one statement QUERY_REPEAT_WARNING times gets a warning"""
+    monkeypatch.setattr(querycount, "QUERY_REPEAT_WARNING", 3)
+    app = make_app()
+    with pytest.warns(RepeatedQueryWarning, match="/students/4 ran this statement 3 times"):
+        request(app, "/students/4")
+    
+    with warnings.catch_warnings(record=True) as recorded:
+        warnings.simplefilter("always")
+        request(app, "/students/2")
+    assert not [w for w in recorded if issubclass(w.category, RepeatedQueryWarning)]
@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+import asyncio
+import json
+from sqlalchemy import select
+from database import init_db, AsyncSessionLocal, Class
+from models import Class as ClassModel
+from serialize import columns_for, dump_list
+
+def test_dump_list_matches_model_serialization():
+    """Test column rows and ORM objects serialize exactly like the response model"""
+    async def run():
+        await init_db(seed=True)
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(*columns_for(Class, ClassModel)).order_by(Class.id))).all()
+            objects = (await session.execute(select(Class).order_by(Class.id))).scalars().all()
+            return rows, objects
+    
+    rows, objects = asyncio.run(run())
+    expected = [json.loads(ClassModel.model_validate(obj).model_dump_json(by_alias=True)) for obj in objects]
+    assert expected
+    assert json.loads(dump_list(ClassModel, rows)) == expected
+    assert json.loads(dump_list(ClassModel, objects)) == expected
+    assert "dayOfWeek" in expected[0]
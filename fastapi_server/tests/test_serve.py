@@ -0,0 +1,22 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from serve import build_config, parse_args
+
+def test_production_config_uses_workers(monkeypatch):
+    """Test serve runs multiple workers without reload and reads limits from env"""
+    monkeypatch.setenv("LIMIT_CONCURRENCY", "200")
+    monkeypatch.setenv("KEEP_ALIVE_TIMEOUT", "15")
+    config = build_config(parse_args(["--workers", "4"]))
+    assert config["workers"] == 4
+    assert "reload" not in config
+    assert config["limit_concurrency"] == 200
+    assert config["timeout_keep_alive"] == 15
+    assert config["timeout_graceful_shutdown"] == 30
+
+def test_reload_is_single_process():
+    """Test --reload runs one auto-reloading process"""
+    config = build_config(parse_args(["--reload", "--workers", "4"]))
+    assert config["reload"] is True
+    assert "workers" not in config
@@ -0,0 +1,111 @@
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import event, select, update
+from typing import Optional
+import hashlib
+import os
+import time
+from dotenv import load_dotenv
+
+from database import AsyncSessionLocal, TableVersion
+from jobs import job_queue
+
+load_dotenv()
+
+# ETags for the catalog endpoints come from the table_versions counters. Each
+# worker keeps a copy of the counters and re-reads them at most every
+# VERSION_REFRESH_SECONDS, so a conditional GET that still matches is
+# answered with 304 without touching the database. A bump committed in this
+# worker drops the copy immediately. Bumps from other workers show up within
+# one refresh interval.
+#
+# Writes do not bump the counters inside their own transaction: there is one
+# row per table, so on PostgreSQL every seat change in the system would queue
+# on its row lock until the writer commits. bump_after_commit notes the
+# tables in the session instead, and once the write has committed the route
+# calls publish_version_bumps, which queues bump_versions to increment them
+# in a short transaction of its own. ETags therefore trail writes by the job
+# queue's lag. A bump lost with a killed worker is made up by the next write
+# to the table, or by `python manage.py bump-versions`.
+VERSION_REFRESH_SECONDS = float(os.getenv("VERSION_REFRESH_SECONDS", 1))
+
+_versions: dict[str, int] = {}
+_loaded_at = float("-inf")
+
+def bump_after_commit(db: AsyncSession, *names: str) -> None:
+    """Bump table versions once db's transaction commits (see publish_version_bumps)"""
+    db.info.setdefault("pending_bumps", set()).update(names)
+
+async def publish_version_bumps(db: AsyncSession) -> None:
+    """Queue the bumps of every transaction db has committed since the last call"""
+    names = db.info.pop("committed_bumps", None)
+    if names:
+        await job_queue.enqueue("bump_versions", bump_versions, *sorted(names))
+
+async def bump_versions(*names: str) -> None:
+    """Background job: bump table versions in a transaction of their own"""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(TableVersion)
+            .where(TableVersion.name.in_(names))
+            .values(version=TableVersion.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.info["bumped_versions"] = True
+        await db.commit()
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_bumps(session):
+    global _loaded_at
+    pending = session.info.pop("pending_bumps", None)
+    if pending:
+        session.info.setdefault("committed_bumps", set()).update(pending)
+    if session.info.pop("bumped_versions", False):
+        _loaded_at = float("-inf")
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_bumps(session):
+    session.info.pop("pending_bumps", None)
+    session.info.pop("bumped_versions", None)
+
+async def _read_versions(db: AsyncSession) -> dict[str, int]:
+    result = await db.execute(select(TableVersion.name, TableVersion.version))
+    return dict(result.all())
+
+async def current_versions(db: Optional[AsyncSession] = None) -> dict[str, int]:
+    """This worker's copy of the table versions, re-read when it is too old.
+
+    Pass the request's session so the re-read uses the connection it already
+    holds. Opening a second connection per request can exhaust the pool when
+    many requests refresh at once, each waiting for another's connection.
+    """
+    global _versions, _loaded_at
+    now = time.monotonic()
+    if now - _loaded_at >= VERSION_REFRESH_SECONDS:
+        if db is not None:
+            _versions = await _read_versions(db)
+        else:
+            async with AsyncSessionLocal() as session:
+                _versions = await _read_versions(session)
+        _loaded_at = now
+    return _versions
+
+async def make_etag(
+    request: Request, *tables: str, scope: str = "", db: Optional[AsyncSession] = None
+) -> str:
+    """Strong ETag for a response built from tables, varying by URL and scope"""
+    versions = await current_versions(db)
+    parts = [request.url.path, request.url.query, scope]
+    parts += [f"{table}={versions.get(table, 0)}" for table in tables]
+    return '"' + hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest() + '"'
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 if the client already has etag; otherwise tag response with it"""
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers={"ETag": etag})
+    return None